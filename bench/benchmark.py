@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+benchmark.py - time and memory benchmarks for sfs-select on a synthetic Steam root
+http://steamcommunity.com/groups/familysharing/discussions/0/540736965953254153/
+"""
+
+__copyright__ = "© 2026 by the sfs-select contributors"
+__license__ = "GPL-3.0-or-later"
+
+#    This file is part of sfs-select.
+#
+#    sfs-select is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    sfs-select is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with sfs-select.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import contextlib
+import importlib.util
+
+import steamgen
+
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, basedir)
+
+import vdf
+import binvdf
+
+def loadsfs():
+    spec = importlib.util.spec_from_file_location("sfs_select_main", os.path.join(basedir, "sfs-select.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class Bench(object):
+    def __init__(self, root, workdir, repeat, runner):
+        self.root = root
+        self.runner = runner
+        self.workdir = workdir
+        self.repeat = repeat
+        self.sfsmod = None
+        self.results = {}
+        self.file_config = os.path.join(root, "config", "config.vdf")
+        self.file_pkginfo = os.path.join(root, "appcache", "packageinfo.vdf")
+        self.file_appinfo = os.path.join(root, "appcache", "appinfo.vdf")
+        userdata = os.path.join(root, "userdata")
+        self.userfiles = sorted(os.path.join(userdata, uid, "config", "localconfig.vdf") for uid in os.listdir(userdata))
+        with open(os.path.join(workdir, "sfs-settings.json"), "w", encoding="utf-8") as handle:
+            json.dump({"steampath": root, "steampath2": root}, handle)
+
+    def sfs(self):
+        if self.sfsmod is None:
+            self.sfsmod = loadsfs()
+        return self.sfsmod.sfs_select()
+
+    def clearcaches(self):
+        for filename in ("sfs-cache.sqlite", "sfs-appinfo.idx"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.workdir, filename))
+
+    def measure(self, name, run, setup=None):
+        # the best of several timed runs, then one more run under
+        # tracemalloc for the peak, which would skew the timings
+        best = None
+        for _ in range(self.repeat):
+            args = setup() if setup else ()
+            gc.collect()
+            start = time.perf_counter()
+            run(*args)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        args = setup() if setup else ()
+        gc.collect()
+        tracemalloc.start()
+        run(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.record(name, best, peak)
+
+    def measurecli(self, name, args, setup=None):
+        best = None
+        peak = 0
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            # forked by clirun.py, see there
+            request = {"args": [sys.executable, os.path.join(basedir, "sfs-select.py")] + args, "cwd": self.workdir}
+            self.runner.stdin.write(json.dumps(request) + "\n")
+            self.runner.stdin.flush()
+            reply = json.loads(self.runner.stdout.readline())
+            if reply["status"]:
+                raise RuntimeError("sfs-select.py {} exited with {}".format(" ".join(args), reply["status"]))
+            best = reply["time"] if best is None else min(best, reply["time"])
+            peak = max(peak, reply["peak"])
+        self.record(name, best, peak)
+
+    def record(self, name, elapsed, peak):
+        self.results[name] = {"time": elapsed, "peak": peak}
+        print("{:<28} {:>9.4f} s {:>10.1f} MiB".format(name, elapsed, peak / (1 << 20)), flush=True)
+
+    def run_vdf(self):
+        biggest = max(self.userfiles, key=os.path.getsize)
+        self.measure("vdf.parse config", vdf.VdfFile, lambda: (self.file_config,))
+        self.measure("vdf.parse localconfig", vdf.VdfFile, lambda: (biggest,))
+        self.measure("vdf.parse localconfig skim", vdf.VdfFile, lambda: (biggest, ["UserLocalConfigStore/friends"]))
+
+        # a file cut off inside a skipped section, as while Steam writes it,
+        # has to fail right away
+        truncated = os.path.join(self.workdir, "localconfig.truncated.vdf")
+        with open(truncated, "w", encoding="utf-8") as handle:
+            handle.write('"UserLocalConfigStore"\n{\n\t"broadcast"\n\t{\n\t\t' + "x" * 64)
+
+        def skim_truncated(filename):
+            try:
+                vdf.VdfFile(filename, ["UserLocalConfigStore/friends"])
+            except ValueError:
+                return
+            raise RuntimeError("{} parsed without an error".format(filename))
+        self.measure("vdf.parse truncated skim", skim_truncated, lambda: (truncated,))
+
+        def compile_setup():
+            config = vdf.VdfFile(self.file_config)
+            devices = config.data["InstallConfigStore"]["AuthorizedDevice"]
+            raw = [devices[uid].getraw() for uid in reversed(list(devices))]
+            devices.clear()
+            for lines in raw:
+                devices.append(lines)
+            return config, os.path.join(self.workdir, "config.vdf.out")
+        self.measure("vdf.compile config", lambda config, newfile: config.compilenewfile(newfile), compile_setup)
+
+    def run_binvdf(self):
+        self.measure("binvdf.parsepkginfo", binvdf.parsepkginfo, lambda: (self.file_pkginfo,))
+        self.measure("binvdf.parseappinfo", binvdf.parseappinfo, lambda: (self.file_appinfo,))
+        fields = [("appinfo", "common", "name")]
+        self.measure("binvdf.parseappinfo names", binvdf.parseappinfo, lambda: (self.file_appinfo, None, None, fields))
+
+    def run_sfs(self):
+        os.chdir(self.workdir)
+        self.measure("sfs.read_shares", lambda sfs: sfs.read_shares(), lambda: (self.sfs(),))
+
+        def loaded():
+            sfs = self.sfs()
+            sfs.read_shares()
+            return (sfs,)
+
+        def nonames():
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.workdir, "sfs-names.json"))
+            return loaded()
+        self.measure("sfs.write_shares", lambda sfs: sfs.write_shares(), loaded)
+        self.measure("sfs.gathernames cold", lambda sfs: sfs.gathernames(), nonames)
+        self.measure("sfs.gathernames warm", lambda sfs: sfs.gathernames(), loaded)
+        apps = [[str(appid * 10) for appid in range(1, 51)]]
+
+        def locate(sfs):
+            with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+                sfs.locate_source(apps)
+                sfs.infocache.close()
+
+        def cold():
+            self.clearcaches()
+            return loaded()
+        self.measure("sfs.locate_source cold", locate, cold)
+        self.measure("sfs.locate_source warm", locate, loaded)
+
+        def bulk(sfs):
+            with open(os.devnull, "w") as null:
+                sfs.locate_bulk(None, out=null)
+                sfs.infocache.close()
+        self.measure("sfs.locate_bulk all", bulk, loaded)
+
+    def run_cli(self):
+        uids = [os.path.basename(os.path.dirname(os.path.dirname(filename))) for filename in self.userfiles]
+        self.measurecli("cli -l", ["-N", "-l"])
+        self.measurecli("cli -e/-H", ["-N", "-e", uids[0], "-H", uids[-1]])
+        self.measurecli("cli -f cold", ["-N", "-f", "10", "20", "30"], self.clearcaches)
+        self.measurecli("cli -f warm", ["-N", "-f", "10", "20", "30"])
+        # the fake Steam from steamgen, quit and restarted around an edit
+        import steamctl
+        launcher = os.path.join(self.root, "steam.sh")
+        pidfiles = steamctl.pidfiles(self.root)
+        self.measurecli("cli -Q -R -e", ["-Q", "-R", "-e", uids[0]], lambda: steamctl.find("steam", pidfiles) or steamctl.start(launcher, "steam", pidfiles))
+        steamctl.shutdown(launcher, "steam", pidfiles, self.file_config)
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, base in sorted(baseline.get("results", {}).items()):
+        if name not in results:
+            continue
+        for key in ("time", "peak"):
+            if base[key] and results[name][key] > base[key] * (1 + tolerance):
+                regressions.append((name, key, base[key], results[name][key]))
+    for name, key, old, new in regressions:
+        print("REGRESSION {} {}: {:.4g} -> {:.4g} ({:+.0%})".format(name, key, old, new, new / old - 1))
+    return regressions
+
+def main():
+    groups = ["vdf", "binvdf", "sfs", "cli"]
+    parser = argparse.ArgumentParser(description="benchmark sfs-select against a synthetic Steam root")
+    parser.add_argument('--root', help='use an existing generated Steam root instead of a temporary one (files will be rewritten)')
+    parser.add_argument('--only', nargs='+', choices=groups, default=groups, help='benchmark groups to run')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per benchmark, the best one counts')
+    parser.add_argument('--save', metavar='FILE', help='write the results as a JSON baseline')
+    parser.add_argument('--baseline', metavar='FILE', help='compare against a JSON baseline, exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown or growth (default 0.25)')
+    scale = parser.add_argument_group('synthetic data scale')
+    scale.add_argument('--lenders', type=int, default=20)
+    scale.add_argument('--licenses', type=int, default=300)
+    scale.add_argument('--packages', type=int, default=5000)
+    scale.add_argument('--apps', type=int, default=5000)
+    scale.add_argument('--localapps', type=int, default=500)
+    args = parser.parse_args()
+
+    # started while this process is still small
+    runner = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "clirun.py")],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+    with runner, tempfile.TemporaryDirectory(prefix="sfs-bench-") as tmpdir:
+        root = os.path.abspath(args.root) if args.root else os.path.join(tmpdir, "Steam")
+        if not os.path.isdir(root):
+            steamgen.steamroot(root, args.lenders, licenses=args.licenses, packages=args.packages,
+                               apps=args.apps, localapps=args.localapps)
+        workdir = os.path.join(tmpdir, "work")
+        os.mkdir(workdir)
+        cwd = os.getcwd()
+        bench = Bench(root, workdir, args.repeat, runner)
+        try:
+            for group in groups:
+                if group in args.only:
+                    getattr(bench, "run_" + group)()
+        finally:
+            os.chdir(cwd)
+
+    scaleinfo = {key: getattr(args, key) for key in ("lenders", "licenses", "packages", "apps", "localapps")}
+    report = {"python": platform.python_version(), "machine": platform.machine(),
+              "scale": scaleinfo, "repeat": args.repeat, "results": bench.results}
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, sort_keys=True, indent=4, separators=(',', ': '))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        if baseline.get("scale") != scaleinfo:
+            print("warning: baseline was recorded at a different scale")
+        if compare(bench.results, baseline, args.tolerance):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+clirun.py - runs sfs-select CLI calls for benchmark.py and reports their time and peak memory
+http://steamcommunity.com/groups/familysharing/discussions/0/540736965953254153/
+"""
+
+__copyright__ = "© 2026 by the sfs-select contributors"
+__license__ = "GPL-3.0-or-later"
+
+#    This file is part of sfs-select.
+#
+#    sfs-select is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    sfs-select is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with sfs-select.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import sys
+import json
+import time
+import subprocess
+
+# a child's ru_maxrss includes the RSS it inherited at fork, even across
+# exec; benchmark.py starts this process before it loads any data and
+# has it fork the CLI runs, so the reported peaks are the CLI's own
+# (with this small process as the floor)
+
+def main():
+    for line in sys.stdin:
+        request = json.loads(line)
+        start = time.perf_counter()
+        proc = subprocess.Popen(request["args"], cwd=request["cwd"], stdout=subprocess.DEVNULL)
+        status, rusage = os.wait4(proc.pid, 0)[1:]
+        elapsed = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        print(json.dumps({"status": proc.returncode, "time": elapsed, "peak": rusage.ru_maxrss * 1024}), flush=True)
+
+if __name__ == '__main__':
+    main()
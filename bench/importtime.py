@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+importtime.py - check that the sfs-select CLI path stays free of Qt and psutil imports
+http://steamcommunity.com/groups/familysharing/discussions/0/540736965953254153/
+"""
+
+__copyright__ = "© 2026 by the sfs-select contributors"
+__license__ = "GPL-3.0-or-later"
+
+#    This file is part of sfs-select.
+#
+#    sfs-select is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    sfs-select is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with sfs-select.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+import steamgen
+
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules only the GUI or Steam process control may load
+forbidden = ("PyQt5", "gui", "mainwindow", "psutil", "steamctl")
+
+def importtimes(args, cwd):
+    # -X importtime writes "import time: self [us] | cumulative | name"
+    # lines to stderr, nested imports are indented
+    proc = subprocess.run([sys.executable, "-X", "importtime", os.path.join(basedir, "sfs-select.py")] + args,
+                          cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode:
+        sys.stderr.write(proc.stderr)
+        raise RuntimeError("sfs-select.py {} exited with {}".format(" ".join(args), proc.returncode))
+    res = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, total, name = line[len("import time:"):].split("|")
+        res.append((name.strip(), len(name) - len(name.lstrip()) - 1, int(own), int(total)))
+    return res
+
+def main():
+    parser = argparse.ArgumentParser(description="check imports and import time of the sfs-select CLI paths")
+    parser.add_argument('--budget', type=float, default=250, help='maximum total import time per run in ms (default 250)')
+    parser.add_argument('--top', type=int, default=0, help='show the N slowest top level imports of each run')
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="sfs-importtime-") as tmpdir:
+        root = os.path.join(tmpdir, "Steam")
+        steamgen.steamroot(root, lenders=3, licenses=20, packages=200, apps=200, localapps=10)
+        with open(os.path.join(tmpdir, "sfs-settings.json"), "w", encoding="utf-8") as handle:
+            json.dump({"steampath": root, "steampath2": root}, handle)
+        uid = steamgen.lenderid(0)
+        for run in (["-N", "-l"], ["-N", "-e", uid], ["-N", "-d", uid], ["-N", "-f", "10"]):
+            imports = importtimes(run, tmpdir)
+            total = sum(own for _, _, own, _ in imports) / 1000
+            bad = sorted({name for name, _, _, _ in imports if name.split(".")[0] in forbidden})
+            status = "ok"
+            if bad:
+                status = "FAIL imports " + ", ".join(bad)
+            elif total > args.budget:
+                status = "FAIL over budget"
+            failed = failed or status != "ok"
+            print("{:<24} {:>8.1f} ms  {}".format(" ".join(run), total, status))
+            top = sorted((entry for entry in imports if entry[1] == 0), key=lambda entry: -entry[3])
+            for name, _, _, cumulative in top[:args.top]:
+                print("    {:<30} {:>8.1f} ms".format(name, cumulative / 1000))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+steamgen.py - generate a synthetic Steam root for benchmarking sfs-select
+http://steamcommunity.com/groups/familysharing/discussions/0/540736965953254153/
+"""
+
+__copyright__ = "© 2026 by the sfs-select contributors"
+__license__ = "GPL-3.0-or-later"
+
+#    This file is part of sfs-select.
+#
+#    sfs-select is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    sfs-select is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with sfs-select.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import sys
+import struct
+import random
+import hashlib
+import argparse
+
+pkginfo_versions = {27: 0x06565527, 28: 0x06565528}
+appinfo_versions = {27: 0x07564427, 28: 0x07564428, 29: 0x07564429}
+
+def quote(value):
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def textsect(out, name, items, depth=0):
+    indent = "\t" * depth
+    out.append(indent + quote(name) + "\n")
+    out.append(indent + "{\n")
+    for key, value in items:
+        if isinstance(value, list):
+            textsect(out, key, value, depth + 1)
+        else:
+            out.append(indent + "\t" + quote(key) + "\t\t" + quote(value) + "\n")
+    out.append(indent + "}\n")
+
+def writetext(filename, name, items):
+    out = []
+    textsect(out, name, items)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "w", encoding="utf-8", newline="\n") as handle:
+        handle.write("".join(out))
+
+def binitems(out, items, keys=None):
+    for key, value in items.items():
+        if keys is None:
+            key = key.encode("utf-8") + b"\0"
+        else:
+            key = struct.pack("<i", keys.setdefault(key, len(keys)))
+        if isinstance(value, dict):
+            out += b"\x00" + key
+            binitems(out, value, keys)
+            out += b"\x08"
+        elif isinstance(value, str):
+            out += b"\x01" + key + value.encode("utf-8") + b"\0"
+        elif value >= 1 << 32:
+            out += b"\x07" + key + struct.pack("<Q", value)
+        else:
+            out += b"\x02" + key + struct.pack("<I", value)
+
+def bindict(items, keys=None):
+    out = bytearray()
+    binitems(out, items, keys)
+    out += b"\x08"
+    return out
+
+def lenderid(num):
+    return str(10000000 + num * 7919)
+
+def config(filename, lenders, devices=0, compat=200, seed=1):
+    rnd = random.Random(seed)
+    authorized = []
+    for num in range(lenders + devices):
+        authorized.append((lenderid(num), [("timeused", rnd.randrange(1400000000, 1700000000)),
+                                           ("description", "DESKTOP-{:04X}".format(num)),
+                                           ("tokenid", rnd.randrange(1 << 60, 1 << 62))]))
+    compatmap = [(str(appid * 10), [("name", "proton_experimental"), ("config", ""), ("priority", "250")])
+                 for appid in range(1, compat + 1)]
+    items = [("Software", [("Valve", [("Steam", [("AutoUpdateWindowEnabled", "0"),
+                                                 ("CompatToolMapping", compatmap),
+                                                 ("SurveyDate", "2019-01-01")])])]),
+             ("AuthorizedDevice", authorized),
+             ("AuthorizedLender", [(lenderid(num), "Lender {}".format(num)) for num in range(0, lenders, 3)]),
+             ("Music", [("CrawlSteamInstallFolders", "1")])]
+    writetext(filename, "InstallConfigStore", items)
+
+def localconfig(filename, lenders, licenses, packages, apps=0, seed=1):
+    rnd = random.Random(seed)
+    friends = [(lenderid(num), [("name", "Lender \"{}\" {}".format(num, seed)), ("tag", "")]) for num in range(lenders)]
+    friends.append(("PersonaName", "User {}".format(seed)))
+    played = [(str(appid * 10), [("LastPlayed", rnd.randrange(1400000000, 1700000000)),
+                                 ("Playtime", rnd.randrange(10000)),
+                                 ("LaunchOptions", "PROTON_LOG=1 %command% -novid"),
+                                 ("cloud", [("last_sync_state", "synchronized"), ("quota_bytes", rnd.randrange(1 << 30))])])
+              for appid in range(1, apps + 1)]
+    owned = sorted(rnd.sample(range(1, packages + 1), min(licenses, packages)))
+    items = [("broadcast", [("Permissions", "1")]),
+             ("friends", friends),
+             ("Software", [("Valve", [("Steam", [("apps", played), ("LastPlayedTimesSyncTime", "1")])])]),
+             ("Licenses", [(str(pkg), [("LastUse", "0")]) for pkg in owned]),
+             ("WebStorage", [("key{}".format(num), "{{\"value\":{}}}".format(num)) for num in range(200)])]
+    writetext(filename, "UserLocalConfigStore", items)
+
+def packageinfo(filename, packages, apps, version=28, seed=1):
+    rnd = random.Random(seed)
+    out = bytearray(struct.pack("<II", pkginfo_versions[version], 1))
+    for pkgid in range(1, packages + 1):
+        appids = {str(num): rnd.randrange(1, apps + 1) * 10 for num in range(rnd.randint(1, 6))}
+        data = {str(pkgid): {"packageid": pkgid, "billingtype": 10, "licensetype": 1, "status": 0,
+                             "extended": {"allowcrossregiontradingandgifting": "false", "expirytime": 0},
+                             "appids": appids,
+                             "depotids": {str(num): rnd.randrange(10, 10 ** 6) for num in range(rnd.randint(1, 10))},
+                             "appitems": {}}}
+        out += struct.pack("<I", pkgid) + hashlib.sha1(str(pkgid).encode()).digest()
+        out += struct.pack("<I", rnd.randrange(1 << 31))
+        if version >= 28:
+            out += struct.pack("<Q", pkgid * 7919)
+        out += bindict(data)
+    out += struct.pack("<I", 0xffffffff)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "wb") as handle:
+        handle.write(out)
+
+def appinfo(filename, apps, version=29, seed=1):
+    rnd = random.Random(seed)
+    keys = {} if version >= 29 else None
+    out = bytearray(struct.pack("<II", appinfo_versions[version], 1))
+    if keys is not None:
+        out += struct.pack("<Q", 0)
+    for appid in range(10, apps * 10 + 1, 10):
+        data = {"appinfo": {"appid": appid,
+                            "common": {"name": "Game {} é".format(appid), "type": "Game", "oslist": "windows,linux",
+                                       "languages": {"english": "1", "german": "1"},
+                                       "associations": {str(num): {"type": "developer", "name": "Dev {}".format(num)} for num in range(3)}},
+                            "extended": {"developer": "x" * rnd.randint(5, 60), "gamedir": "dir{}".format(appid)},
+                            "config": {"launch": {str(num): {"executable": "game{}.exe".format(num), "type": "default"}
+                                                  for num in range(rnd.randint(1, 4))}},
+                            "depots": {str(appid + num): {"manifests": {"public": {"gid": rnd.randrange(1 << 63), "size": "12345"}}}
+                                       for num in range(rnd.randint(1, 5))}}}
+        body = struct.pack("<IIQ", 2, rnd.randrange(1 << 31), rnd.randrange(1 << 63))
+        body += hashlib.sha1(str(appid).encode()).digest() + struct.pack("<I", rnd.randrange(1 << 31))
+        if version >= 28:
+            body += hashlib.sha1(b"binary" + str(appid).encode()).digest()
+        body += bindict(data, keys)
+        out += struct.pack("<II", appid, len(body)) + body
+    out += struct.pack("<I", 0)
+    if keys is not None:
+        struct.pack_into("<Q", out, 8, len(out))
+        out += struct.pack("<I", len(keys))
+        for key in sorted(keys, key=keys.get):
+            out += key.encode("utf-8") + b"\0"
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "wb") as handle:
+        handle.write(out)
+
+# stand-ins for the Steam launcher and client: the client records its pid
+# in steam.pid and, like Steam, rewrites config.vdf while shutting down;
+# "steam.sh -shutdown" asks the running client to quit
+fake_launcher = """#!/bin/sh
+root="$(cd "$(dirname "$0")" && pwd)"
+if [ "$1" = "-shutdown" ]; then
+    [ -f "$root/steam.pid" ] && kill -TERM "$(cat "$root/steam.pid")" 2>/dev/null
+    exit 0
+fi
+exec "$root/ubuntu12_32/steam" "$@"
+"""
+
+fake_client = """#!{python}
+import os, signal, sys, time
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+pidfile = os.path.join(root, "steam.pid")
+config = os.path.join(root, "config", "config.vdf")
+def shutdown(signum, frame):
+    for _ in range(3):
+        time.sleep(0.05)
+        os.utime(config)
+    os.remove(pidfile)
+    sys.exit(0)
+signal.signal(signal.SIGTERM, shutdown)
+time.sleep({startup})
+with open(pidfile, "w") as handle:
+    handle.write(str(os.getpid()))
+while True:
+    signal.pause()
+"""
+
+def fakesteam(root, startup=0.2):
+    client = os.path.join(root, "ubuntu12_32", "steam")
+    os.makedirs(os.path.dirname(client), exist_ok=True)
+    for filename, content in ((os.path.join(root, "steam.sh"), fake_launcher),
+                              (client, fake_client.format(python=sys.executable, startup=startup))):
+        with open(filename, "w") as handle:
+            handle.write(content)
+        os.chmod(filename, 0o755)
+
+def steamroot(root, lenders=20, devices=2, licenses=300, packages=5000, apps=5000,
+              localapps=500, pkgversion=28, appversion=29, seed=1):
+    # the layout sfs-select expects with steampath = steampath2 = root;
+    # every lender also gets a userdata directory of its own
+    os.makedirs(root, exist_ok=True)
+    fakesteam(root)
+    config(os.path.join(root, "config", "config.vdf"), lenders, devices, seed=seed)
+    for num in range(lenders):
+        filename = os.path.join(root, "userdata", lenderid(num), "config", "localconfig.vdf")
+        localconfig(filename, lenders, licenses, packages, localapps, seed=seed + num)
+    packageinfo(os.path.join(root, "appcache", "packageinfo.vdf"), packages, apps, pkgversion, seed)
+    appinfo(os.path.join(root, "appcache", "appinfo.vdf"), apps, appversion, seed)
+
+def main():
+    parser = argparse.ArgumentParser(description="generate a synthetic Steam root directory")
+    parser.add_argument('root', help='directory to create the Steam root in')
+    parser.add_argument('--lenders', type=int, default=20, help='number of lenders, each with a userdata directory')
+    parser.add_argument('--devices', type=int, default=2, help='additional authorized devices without userdata')
+    parser.add_argument('--licenses', type=int, default=300, help='licenses per user')
+    parser.add_argument('--packages', type=int, default=5000, help='packages in packageinfo.vdf')
+    parser.add_argument('--apps', type=int, default=5000, help='apps in appinfo.vdf')
+    parser.add_argument('--localapps', type=int, default=500, help='apps per localconfig.vdf, mainly adds file size')
+    parser.add_argument('--pkginfo-version', type=int, choices=sorted(pkginfo_versions), default=28)
+    parser.add_argument('--appinfo-version', type=int, choices=sorted(appinfo_versions), default=29)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    steamroot(args.root, args.lenders, args.devices, args.licenses, args.packages, args.apps,
+              args.localapps, args.pkginfo_version, args.appinfo_version, args.seed)
+    print("generated Steam root in {}".format(args.root))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -25,101 +25,400 @@ __license__ = "GPL-3.0-or-later"
 #    along with sfs-select.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import os
+import sys
 import struct
 import base64
+import mmap
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 s_int = struct.Struct("I")
 s_long = struct.Struct("Q")
+s_indexhead = struct.Struct("<4sQQ16sI")
+s_indexentry = struct.Struct("<IQI")
+index_magic = b"SFSI"
 
-def readint():
-    return s_int.unpack(infile.read(4))[0]
+pkginfo_v27 = 0x06565527
+pkginfo_v28 = 0x06565528
+appinfo_v27 = 0x07564427
+appinfo_v28 = 0x07564428
+appinfo_v29 = 0x07564429
+pkginfo_versions = (pkginfo_v27, pkginfo_v28)
+appinfo_versions = (appinfo_v27, appinfo_v28, appinfo_v29)
 
-def readlong():
-    return s_long.unpack(infile.read(8))[0]
+def decode(raw):
+    try:
+        return raw.decode("utf8")
+    except Exception:
+        return raw.decode("latin1")
 
-def readstr():
-    res = []
+@contextmanager
+def mapfile(filename):
+    with open(filename, "rb") as handle:
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+class BinVdfReader(object):
+    def __init__(self, buf, pos=0):
+        self.buf = buf
+        self.pos = pos
+        self.version = None
+        self.universe = None
+        self.keytable = None
+        self.keyoffset = None
+        self.keycache = {}
+        self.start = None
+
+    def readheader(self, versions):
+        self.pos = 0
+        self.version = self.readint()
+        self.universe = self.readint()
+        if self.version not in versions:
+            raise ValueError("unsupported vdf version {:#x}".format(self.version))
+        if self.version >= appinfo_v29:
+            self.keyoffset = self.readlong()
+        self.start = self.pos
+
+    def readkeytable(self):
+        count = s_int.unpack_from(self.buf, self.keyoffset)[0]
+        keys = self.buf[self.keyoffset + 4:].split(b'\x00', count)[:count]
+        self.keytable = [sys.intern(decode(key)) for key in keys]
+        return self.keytable
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        self.pos = offset
+
+    def read(self, length):
+        pos = self.pos
+        self.pos = pos + length
+        return self.buf[pos:pos + length]
+
+    def readint(self):
+        value = s_int.unpack_from(self.buf, self.pos)[0]
+        self.pos += 4
+        return value
+
+    def readlong(self):
+        value = s_long.unpack_from(self.buf, self.pos)[0]
+        self.pos += 8
+        return value
+
+    def readstr(self):
+        pos = self.pos
+        end = self.buf.find(b'\x00', pos)
+        self.pos = end + 1
+        return decode(self.buf[pos:end])
+
+    def readdict(self, fields=None):
+        buf = self.buf
+        find = buf.find
+        keytable = self.keytable
+        if keytable is None and self.keyoffset is not None:
+            keytable = self.readkeytable()
+        keycache = self.keycache
+        wildcard = fields.get("*") if fields is not None else None
+        pos = self.pos
+        res = {}
+        sub = None
+        while True:
+            dtype = buf[pos]
+            pos += 1
+            if dtype == 0x08:
+                break
+            if keytable is None:
+                end = find(b'\x00', pos)
+                raw = buf[pos:end]
+                pos = end + 1
+                name = keycache.get(raw)
+                if name is None:
+                    name = keycache[raw] = sys.intern(decode(raw))
+            else:
+                name = keytable[s_int.unpack_from(buf, pos)[0]]
+                pos += 4
+            if fields is not None:
+                sub = fields.get(name, wildcard)
+                if sub is None or (sub is not True and dtype != 0x00):
+                    pos = self.skipvalue(dtype, pos)
+                    continue
+                if sub is True:
+                    sub = None
+            if dtype == 0x00:
+                self.pos = pos
+                value = self.readdict(sub)
+                pos = self.pos
+            elif dtype == 0x01:
+                end = find(b'\x00', pos)
+                value = decode(buf[pos:end])
+                pos = end + 1
+            elif dtype == 0x02:
+                value = s_int.unpack_from(buf, pos)[0]
+                pos += 4
+            elif dtype == 0x07:
+                value = s_long.unpack_from(buf, pos)[0]
+                pos += 8
+            else:
+                print("unknown\t", bytes((dtype,)), name)
+                print(buf[pos:pos + 50])
+                raise Exception
+            res[name] = value
+        self.pos = pos
+        return res
+
+    def skipvalue(self, dtype, pos):
+        buf = self.buf
+        find = buf.find
+        inlinekeys = self.keyoffset is None
+        depth = 0
+        while True:
+            if dtype == 0x00:
+                depth += 1
+            elif dtype == 0x01:
+                pos = find(b'\x00', pos) + 1
+            elif dtype == 0x02:
+                pos += 4
+            elif dtype == 0x07:
+                pos += 8
+            elif dtype == 0x08:
+                depth -= 1
+            else:
+                print("unknown\t", bytes((dtype,)))
+                print(buf[pos:pos + 50])
+                raise Exception
+            if depth == 0:
+                return pos
+            dtype = buf[pos]
+            pos += 1
+            if dtype != 0x08:
+                if inlinekeys:
+                    pos = find(b'\x00', pos) + 1
+                else:
+                    pos += 4
+
+    def readapp(self, fields=None):
+        app = {}
+        app["unknown1"] = self.readint()
+        app["last_updated"] = self.readint()
+        app["access_token"] = self.readlong()
+        app["sha1"] = base64.b16encode(self.read(20))
+        app["change"] = hex(self.readint())
+        if self.version >= appinfo_v28:
+            app["binary_sha1"] = base64.b16encode(self.read(20))
+        app.update(self.readdict(fields))
+        return app
+
+    def readpkg(self, fields=None):
+        pkg = {}
+        pkg["sha1"] = base64.b16encode(self.read(20))
+        pkg["change"] = hex(self.readint())
+        if self.version >= pkginfo_v28:
+            pkg["access_token"] = self.readlong()
+        pkg.update(self.readdict(fields))
+        return pkg
+
+def fieldtree(fields):
+    if fields is None:
+        return None
+    tree = {}
+    for path in fields:
+        node = tree
+        for key in path[:-1]:
+            if node.get(key) is True:
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[path[-1]] = True
+    return tree
+
+def pkgfieldtree(fields):
+    # package records hold a single section named after the package id
+    return {"*": fieldtree(fields)} if fields is not None else None
+
+def readpkgs(infile, limit=None, fields=None):
+    fields = pkgfieldtree(fields)
+    infile.seek(infile.start)
+    while True:
+        pkgid = infile.readint()
+        if pkgid == 0xffffffff:
+            break
+        pkg = infile.readpkg(fields)
+        if not limit or pkgid in limit:
+            yield pkgid, pkg
+
+def scanpkgs(infile):
+    buf = infile.buf
+    pos = infile.start
+    headsize = 32 if infile.version >= pkginfo_v28 else 24
     while True:
-        p = infile.peek()
-        length = p.find(b'\x00')
-        if length > -1:
-            res.append(infile.read(length+1))
-            res = b''.join(res)[:-1]
-            try:
-                return res.decode("utf8")
-            except Exception:
-                return res.decode("latin1")
-        res.append(infile.read(len(p)))
-
-def readdict():
-    res = {}
+        pkgid = s_int.unpack_from(buf, pos)[0]
+        if pkgid == 0xffffffff:
+            break
+        pos += 4
+        yield pkgid, pos
+        pos = infile.skipvalue(0x00, pos + headsize)
+
+appids_fields = pkgfieldtree([("appids",)])
+
+def readpkgappids(infile, records):
+    # the appids of (pkgid, pos) records found by scanpkgs()
+    res = []
+    for pkgid, pos in records:
+        infile.seek(pos)
+        try:
+            appids = list(infile.readpkg(appids_fields)[str(pkgid)]["appids"].values())
+        except Exception:
+            appids = []
+        res.append((pkgid, appids))
+    return res
+
+def decodepkgappids(filename, records):
+    with mapfile(filename) as buf:
+        infile = BinVdfReader(buf)
+        infile.readheader(pkginfo_versions)
+        return readpkgappids(infile, records)
+
+def iter_pkgappids(infile, filename, records, workers=1, context=None):
+    # (pkgid, appids) of the records in order, a chunk at a time. with
+    # workers > 1 the chunks are decoded in other processes, which send
+    # back only these pairs: whole packages take about as long to unpickle
+    # as to decode. workers=0 means one process per available core,
+    # context is the multiprocessing context of the pool
+    chunks = [records[start:start + 1024] for start in range(0, len(records), 1024)]
+    workers = min(workers or cpucount(), len(chunks))
+    if workers < 2:
+        for chunk in chunks:
+            yield from readpkgappids(infile, chunk)
+        return
+    pool = ProcessPoolExecutor(workers, mp_context=context)
+    try:
+        for part in pool.map(decodepkgappids, repeat(filename), chunks):
+            yield from part
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def iter_packages(filename, limit=None, fields=None):
+    with mapfile(filename) as buf:
+        infile = BinVdfReader(buf)
+        infile.readheader(pkginfo_versions)
+        yield from readpkgs(infile, limit, fields)
+
+def parsepkginfo(filename, limit=None, fields=None):
+    with mapfile(filename) as buf:
+        infile = BinVdfReader(buf)
+        infile.readheader(pkginfo_versions)
+        res = {}
+        res["version"] = hex(infile.version)
+        res["universe"] = hex(infile.universe)
+        res["pkgs"] = dict(readpkgs(infile, limit, fields))
+    return res
+
+def scanapps(infile):
+    buf = infile.buf
+    pos = infile.start
     while True:
-        dtype = infile.read(1)
-        if dtype == b'\x08':
+        appid = s_int.unpack_from(buf, pos)[0]
+        if appid == 0x0:
             break
-        name = readstr()
-        if dtype == b'\x00':
-            value = readdict()
-        elif dtype == b'\x01':
-            value = readstr()
-        elif dtype == b'\x02':
-            value = readint()
-        elif dtype == b'\x07':
-            value = readlong()
+        size = s_int.unpack_from(buf, pos + 4)[0]
+        pos += 8
+        yield appid, pos, size
+        pos += size
+
+def indexkey(filename, buf):
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns, buf[:16].ljust(16, b'\x00')
+
+def readindex(indexfile, key):
+    try:
+        with open(indexfile, "rb") as handle:
+            data = handle.read()
+    except OSError:
+        return None
+    if len(data) < s_indexhead.size:
+        return None
+    magic, size, mtime, header, count = s_indexhead.unpack_from(data)
+    if magic != index_magic or (size, mtime, header) != key:
+        return None
+    if len(data) != s_indexhead.size + count * s_indexentry.size:
+        return None
+    return data[s_indexhead.size:]
+
+def writeindex(indexfile, key, entries):
+    try:
+        with open(indexfile + ".new", "wb") as handle:
+            handle.write(s_indexhead.pack(index_magic, *key, len(entries) // s_indexentry.size))
+            handle.write(entries)
+        os.replace(indexfile + ".new", indexfile)
+    except OSError:
+        pass
+
+def appindex(filename, infile, indexfile):
+    key = indexkey(filename, infile.buf)
+    entries = readindex(indexfile, key)
+    if entries is None:
+        entries = b''.join(s_indexentry.pack(*app) for app in sorted(scanapps(infile)))
+        writeindex(indexfile, key, entries)
+    return entries
+
+def findindex(entries, appid):
+    low, high = 0, len(entries) // s_indexentry.size
+    while low < high:
+        mid = (low + high) // 2
+        found, pos, size = s_indexentry.unpack_from(entries, mid * s_indexentry.size)
+        if found < appid:
+            low = mid + 1
+        elif found > appid:
+            high = mid
         else:
-            print("unknown\t", dtype, name)
-            print(infile.read(50))
-            raise Exception
-        res[name] = value
-    return res
+            return pos, size
+    return None
 
-def readapp():
+def readappat(infile, pos, size, fields=None):
     app = {}
-    app["unknown1"] = readint()
-    app["last_updated"] = readint()
-    app["access_token"] = readlong()
-    app["sha1"] = base64.b16encode(infile.read(20))
-    app["change"] = hex(readint())
-    app.update(readdict())
+    app["data_size"] = size
+    app["data_pos"] = pos
+    infile.seek(pos)
+    app.update(infile.readapp(fields))
+    assert(infile.tell() == app["data_size"] + app["data_pos"])
     return app
 
-def parsepkginfo(filename, limit=None):
-    global infile
-    with open(filename, "rb") as infile:
-        res = {}
-        res["version"] = hex(readint())
-        res["universe"] = hex(readint())
-        res["pkgs"] = {}
-        while True:
-            pkgid = readint()
-            if pkgid == 0xffffffff:
-                break
-            pkg = {}
-            pkg["sha1"] = base64.b16encode(infile.read(20))
-            pkg["change"] = hex(readint())
-            pkg.update(readdict())
-            if not limit or pkgid in limit:
-                res["pkgs"][pkgid] = pkg
-    return res
+def readapps(infile, limit=None, entries=None, fields=None):
+    fields = fieldtree(fields)
+    if limit and entries is not None:
+        wanted = ((findindex(entries, appid), appid) for appid in set(limit))
+        for (pos, size), appid in sorted(item for item in wanted if item[0]):
+            yield appid, readappat(infile, pos, size, fields)
+        return
+    for appid, pos, size in scanapps(infile):
+        if not limit or appid in limit:
+            yield appid, readappat(infile, pos, size, fields)
 
-def parseappinfo(filename, limit=None):
-    global infile
-    with open(filename, "rb") as infile:
+def iter_apps(filename, limit=None, index=None, fields=None):
+    with mapfile(filename) as buf:
+        infile = BinVdfReader(buf)
+        infile.readheader(appinfo_versions)
+        entries = appindex(filename, infile, index) if limit and index else None
+        yield from readapps(infile, limit, entries, fields)
+
+def parseappinfo(filename, limit=None, index=None, fields=None):
+    with mapfile(filename) as buf:
+        infile = BinVdfReader(buf)
+        infile.readheader(appinfo_versions)
+        entries = appindex(filename, infile, index) if limit and index else None
         res = {}
-        res["version"] = hex(readint())
-        res["universe"] = hex(readint())
-        res["apps"] = {}
-        while True:
-            appid = readint()
-            if appid == 0x0:
-                break
-            app = {}
-            app["data_size"] = readint()
-            if not limit or appid in limit:
-                app["data_pos"] = infile.tell()
-                app.update(readapp())
-                res["apps"][appid] = app
-                assert(infile.tell() == app["data_size"] + app["data_pos"])
-            else:
-                infile.seek(app["data_size"], 1)
+        res["version"] = hex(infile.version)
+        res["universe"] = hex(infile.universe)
+        res["apps"] = dict(readapps(infile, limit, entries, fields))
     return res
+
+def cpucount():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
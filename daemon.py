@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+daemon.py - resident sfs-select serving share edits over a unix socket
+http://steamcommunity.com/groups/familysharing/discussions/0/540736965953254153/
+"""
+
+__copyright__ = "© 2026 by the sfs-select contributors"
+__license__ = "GPL-3.0-or-later"
+
+#    This file is part of sfs-select.
+#
+#    sfs-select is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    sfs-select is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with sfs-select.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import io
+import sys
+import json
+import select
+import signal
+import socket
+import ctypes
+import traceback
+import contextlib
+
+protocol_version = 1
+socket_file = "sfs-select.sock"
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+watch_mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+def available():
+    return hasattr(socket, "AF_UNIX")
+
+def request(message, path=socket_file, timeout=120):
+    # returns the exit status of the request, or None if no daemon is
+    # listening and the caller should do the work itself
+    if not available():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    with sock:
+        sock.settimeout(timeout)
+        message = dict(message, version=protocol_version)
+        sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+        data = b"".join(iter(lambda: sock.recv(65536), b""))
+    try:
+        reply = json.loads(data.decode("utf-8"))
+    except ValueError:
+        return None
+    if reply.get("version") != protocol_version:
+        return None
+    sys.stdout.write(reply["output"])
+    sys.stdout.flush()
+    return reply["status"]
+
+class Inotify(object):
+    def __init__(self):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.add_watch = libc.inotify_add_watch
+        self.add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watched = set()
+
+    def watch(self, directory):
+        # files are replaced by rename, so their directories are watched
+        if directory not in self.watched and self.add_watch(self.fd, os.fsencode(directory), watch_mask) >= 0:
+            self.watched.add(directory)
+
+    def fileno(self):
+        return self.fd
+
+    def drain(self, settle=0.2):
+        # read events until things have been quiet for settle seconds;
+        # only the fact that something changed is used
+        while select.select([self.fd], [], [], settle)[0]:
+            try:
+                os.read(self.fd, 65536)
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+class Daemon(object):
+    def __init__(self, sfs, path=socket_file, interval=2.0):
+        self.sfs = sfs
+        self.path = path
+        self.interval = interval
+        self.state = {}
+        self.error = None
+        self.reloads = 0
+        try:
+            self.inotify = Inotify()
+        except (OSError, AttributeError):
+            self.inotify = None
+
+    def watchedfiles(self):
+        sfs = self.sfs
+        files = {sfs.settings_file: "settings", sfs.file_config: "shares", sfs.file_disabled: "shares",
+                 os.path.join(sfs.settings["steampath2"], "appcache", "packageinfo.vdf"): "packages",
+                 os.path.join(sfs.settings["steampath2"], "userdata"): "userdir"}
+        for fname in sfs.userfiles():
+            files[fname] = "user"
+        return files
+
+    def snapshot(self):
+        res = {}
+        for fname, kind in self.watchedfiles().items():
+            try:
+                stat = os.stat(fname)
+                res[fname] = (kind, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                res[fname] = (kind, None)
+            if self.inotify is not None:
+                self.inotify.watch(os.path.dirname(fname) or ".")
+                if kind == "userdir":
+                    self.inotify.watch(fname)
+        return res
+
+    def remember(self, *files):
+        # own writes must not trigger a reload
+        for fname in files:
+            try:
+                stat = os.stat(fname)
+                self.state[fname] = (self.state[fname][0], stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            except (OSError, KeyError):
+                pass
+
+    def load(self, read=True):
+        # the state a fresh sfs-select run would be in after start-up
+        sfs = self.sfs
+        if read:
+            sfs.read_shares()
+            sfs.do_upgrade()
+        sfs.gathernames()
+        sfs.write_settings()
+        self.remember(sfs.settings_file, sfs.file_config, sfs.file_disabled)
+        self.reloads += 1
+
+    def refresh(self, force=False):
+        # returns an error message if the files could not be reloaded, e.g.
+        # config.vdf caught while Steam rewrites it; the old snapshot is
+        # kept then, so the next event or request tries again
+        old = self.state
+        new = self.snapshot()
+        changed = {old.get(fname, state)[0] for fname, state in new.items() if old.get(fname) != state}
+        changed.update(state[0] for fname, state in old.items() if fname not in new)
+        for fname, state in new.items():
+            if state[0] == "user" and old.get(fname) != state:
+                self.sfs.harvest.pop(fname, None)
+        if changed & {"settings", "shares", "packages", "user", "userdir"}:
+            self.sfs.pkg_to_uids = None
+        try:
+            if "settings" in changed:
+                self.sfs.read_settings()
+            if force or changed & {"settings", "shares", "user", "userdir"}:
+                self.load()
+        except (ValueError, LookupError, UnicodeDecodeError) as error:
+            message = "can't reload the Steam files: {!r}".format(error)
+            if message != self.error:
+                print(message, file=sys.stderr, flush=True)
+            self.error = message
+            return message
+        self.state = new
+        self.error = None
+        return None
+
+    def handle(self, message):
+        sfs = self.sfs
+        if message.get("version") != protocol_version:
+            return {"version": protocol_version, "status": None, "output": ""}
+        error = self.refresh()
+        if error is not None:
+            return {"version": protocol_version, "status": 1, "output": "ERROR: {}\n".format(error)}
+        out = io.StringIO()
+        status = 0
+        with contextlib.redirect_stdout(out):
+            try:
+                op = message["op"]
+                if op == "list":
+                    sfs.print_shares()
+                elif op == "edit":
+                    sfs.apply_edits(message.get("enable"), message.get("disable"), message.get("enable_others"),
+                                    message.get("disable_others"), message.get("high_priority"), message.get("low_priority"))
+                    sfs.write_settings()
+                    sfs.write_shares()
+                    sfs.read_shares()
+                    sfs.print_shares()
+                    self.load(read=False)
+                elif op == "locate":
+                    sfs.locate_source(message["apps"])
+                elif op == "batch":
+                    status = sfs.run_batch([tuple(entry) for entry in message["ops"]])
+                    self.load()
+                else:
+                    print("ERROR: unknown request {}".format(op))
+                    status = 1
+            except Exception:
+                traceback.print_exc(file=out)
+                status = 1
+        return {"version": protocol_version, "status": status, "output": out.getvalue()}
+
+    def serve_client(self, conn):
+        with conn:
+            conn.settimeout(10)
+            try:
+                data = b"".join(iter(lambda: conn.recv(65536), b""))
+                reply = self.handle(json.loads(data.decode("utf-8")))
+            except (OSError, ValueError):
+                return
+            try:
+                conn.sendall(json.dumps(reply).encode("utf-8"))
+            except OSError:
+                pass
+
+    def bind(self):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        with probe:
+            try:
+                probe.connect(self.path)
+            except OSError:
+                pass
+            else:
+                raise RuntimeError("a daemon is already listening on {}".format(self.path))
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
+        old = os.umask(0o077)
+        try:
+            server.bind(self.path)
+        finally:
+            os.umask(old)
+        server.listen(8)
+        return server
+
+    def serve(self):
+        server = self.bind()
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        self.refresh(force=True)
+        watching = "inotify" if self.inotify is not None else "polling every {}s".format(self.interval)
+        print("sfs-select daemon listening on {} ({})".format(os.path.abspath(self.path), watching), flush=True)
+        try:
+            while True:
+                sources = [server] if self.inotify is None else [server, self.inotify]
+                timeout = self.interval if self.inotify is None else None
+                ready = select.select(sources, [], [], timeout)[0]
+                if self.inotify is not None and self.inotify in ready:
+                    self.inotify.drain()
+                    self.refresh()
+                elif not ready:
+                    self.refresh()
+                if server in ready:
+                    self.serve_client(server.accept()[0])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.path)
+            if self.inotify is not None:
+                self.inotify.close()
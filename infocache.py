@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+infocache.py - persistent index of Steam package and app info
+http://steamcommunity.com/groups/familysharing/discussions/0/540736965953254153/
+"""
+
+__copyright__ = "© 2026 by the sfs-select contributors"
+__license__ = "GPL-3.0-or-later"
+
+#    This file is part of sfs-select.
+#
+#    sfs-select is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    sfs-select is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with sfs-select.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import sys
+import sqlite3
+
+import binvdf
+
+schema_version = 1
+schema = """
+CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, size INTEGER, mtime INTEGER);
+CREATE TABLE IF NOT EXISTS packages (pkgid INTEGER PRIMARY KEY, change INTEGER, sha1 BLOB);
+CREATE TABLE IF NOT EXISTS package_apps (pkgid INTEGER, appid INTEGER);
+CREATE INDEX IF NOT EXISTS package_apps_pkgid ON package_apps (pkgid);
+CREATE TABLE IF NOT EXISTS apps (appid INTEGER PRIMARY KEY, change INTEGER, sha1 BLOB, name TEXT);
+"""
+
+class InfoCache(object):
+    def __init__(self, filename, timeout=30.0):
+        self.filename = filename
+        try:
+            self.connect(filename, timeout)
+        except sqlite3.OperationalError as error:
+            # locked by another sfs-select, e.g. the daemon syncing: this
+            # run goes without the cache rather than touch the file
+            print("not using {}: {}".format(filename, error), file=sys.stderr)
+            self.connect(":memory:", timeout)
+        except sqlite3.DatabaseError:
+            # not a database or corrupt, start over
+            os.remove(filename)
+            self.connect(filename, timeout)
+
+    def connect(self, filename, timeout):
+        db = sqlite3.connect(filename, timeout)
+        try:
+            if db.execute("PRAGMA user_version").fetchone()[0] != schema_version:
+                with db:
+                    for (table,) in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                        db.execute("DROP TABLE {}".format(table))
+                    db.executescript(schema)
+                    db.execute("PRAGMA user_version = {}".format(schema_version))
+        except sqlite3.Error:
+            db.close()
+            raise
+        self.db = db
+
+    def close(self):
+        self.db.close()
+
+    def unchanged(self, name, filename):
+        stat = os.stat(filename)
+        row = self.db.execute("SELECT size, mtime FROM files WHERE name = ?", (name,)).fetchone()
+        return row == (stat.st_size, stat.st_mtime_ns), (name, stat.st_size, stat.st_mtime_ns)
+
+    def sync_packages(self, filename, cancel=None, workers=1, context=None):
+        # cancel (a threading.Event) stops a long first sync before
+        # anything is written, the result is then None; workers and
+        # context are passed on to binvdf.iter_pkgappids
+        unchanged, stamp = self.unchanged("packageinfo", filename)
+        if unchanged:
+            return 0
+        known = {pkgid: (change, sha1) for pkgid, change, sha1 in self.db.execute("SELECT pkgid, change, sha1 FROM packages")}
+        changed = []
+        with binvdf.mapfile(filename) as buf:
+            infile = binvdf.BinVdfReader(buf)
+            infile.readheader(binvdf.pkginfo_versions)
+            for pkgid, pos in binvdf.scanpkgs(infile):
+                state = (binvdf.s_int.unpack_from(buf, pos + 20)[0], buf[pos:pos + 20])
+                if known.pop(pkgid, None) == state:
+                    continue
+                changed.append((pkgid, pos, state))
+            records = [(pkgid, pos) for pkgid, pos, _ in changed]
+            appids = {}
+            for pkgid, ids in binvdf.iter_pkgappids(infile, filename, records, workers, context):
+                if cancel is not None and cancel.is_set():
+                    return None
+                appids[pkgid] = ids
+        with self.db:
+            for pkgid in list(known) + [pkgid for pkgid, _, _ in changed]:
+                self.db.execute("DELETE FROM packages WHERE pkgid = ?", (pkgid,))
+                self.db.execute("DELETE FROM package_apps WHERE pkgid = ?", (pkgid,))
+            for pkgid, _, (change, sha1) in changed:
+                self.db.execute("INSERT INTO packages VALUES (?, ?, ?)", (pkgid, change, sha1))
+                self.db.executemany("INSERT INTO package_apps VALUES (?, ?)", ((pkgid, appid) for appid in appids[pkgid]))
+            self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", stamp)
+        return len(changed) + len(known)
+
+    def package_apps(self, pkgids):
+        pkgids = list(pkgids)
+        for start in range(0, len(pkgids), 500):
+            chunk = pkgids[start:start + 500]
+            query = "SELECT pkgid, appid FROM package_apps WHERE pkgid IN ({})".format(", ".join("?" * len(chunk)))
+            yield from self.db.execute(query, chunk)
+
+    def app_names(self, filename, appids, indexfile):
+        appids = list(appids)
+        known = {}
+        for start in range(0, len(appids), 500):
+            chunk = appids[start:start + 500]
+            query = "SELECT appid, change, sha1, name FROM apps WHERE appid IN ({})".format(", ".join("?" * len(chunk)))
+            for appid, change, sha1, name in self.db.execute(query, chunk):
+                known[appid] = ((change, sha1), name)
+        fields = binvdf.fieldtree([("appinfo", "common", "name")])
+        names = {}
+        changed = []
+        with binvdf.mapfile(filename) as buf:
+            infile = binvdf.BinVdfReader(buf)
+            infile.readheader(binvdf.appinfo_versions)
+            entries = binvdf.appindex(filename, infile, indexfile)
+            for appid in appids:
+                found = binvdf.findindex(entries, appid)
+                if not found:
+                    continue
+                pos, size = found
+                state = (binvdf.s_int.unpack_from(buf, pos + 36)[0], buf[pos + 16:pos + 36])
+                if appid in known and known[appid][0] == state:
+                    names[appid] = known[appid][1]
+                    continue
+                try:
+                    names[appid] = binvdf.readappat(infile, pos, size, fields)["appinfo"]["common"]["name"]
+                except KeyError:
+                    continue
+                changed.append((appid, state[0], state[1], names[appid]))
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO apps VALUES (?, ?, ?, ?)", changed)
+        return names
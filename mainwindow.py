@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+mainwindow.py - main window of the sfs-select GUI
+http://steamcommunity.com/groups/familysharing/discussions/0/540736965953254153/
+"""
+
+__copyright__ = "© 2014-2019 by Thomas Schmidt (PsyBlade)"
+__license__ = "GPL-3.0-or-later"
+
+#    This file is part of sfs-select.
+#
+#    sfs-select is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    sfs-select is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with sfs-select.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import threading
+import traceback
+
+from PyQt5 import QtCore, QtWidgets
+
+import gui
+
+
+class WorkerSignals(QtCore.QObject):
+    step = QtCore.pyqtSignal(int, str)
+    result = QtCore.pyqtSignal(str, object)
+    error = QtCore.pyqtSignal(str, str)
+    finished = QtCore.pyqtSignal()
+
+
+class Worker(QtCore.QRunnable):
+    # runs (name, function) steps off the GUI thread; the signals object
+    # lives in the GUI thread, so its slots are called there
+    def __init__(self, steps):
+        super(Worker, self).__init__()
+        self.steps = steps
+        self.signals = WorkerSignals()
+
+    def run(self):
+        try:
+            for num, (name, function) in enumerate(self.steps):
+                self.signals.step.emit(num, name)
+                try:
+                    self.signals.result.emit(name, function())
+                except Exception:
+                    self.signals.error.emit(name, traceback.format_exc())
+                    return
+        finally:
+            self.signals.finished.emit()
+
+
+class ShareModel(QtCore.QAbstractTableModel):
+    # the shares in sfs.settings["order"] together with the unsaved edits
+    # of the window; cells are only computed when the view asks for them
+    headers = ("status", "priority", "lender name", "lender ID", "last use", "apps")
+
+    def __init__(self, sfs, parent=None):
+        super(ShareModel, self).__init__(parent)
+        self.sfs = sfs
+        self.uids = []
+        self.enabled = {}
+        self.priority = {}
+        self.names = {}
+        self.apps = {}
+
+    def loadShares(self):
+        # a new set of shares is the only full reset
+        self.beginResetModel()
+        self.uids = list(self.sfs.settings["order"])
+        self.readState()
+        self.endResetModel()
+
+    def readState(self):
+        for num, uid in enumerate(self.uids, 1):
+            share = self.sfs.share[uid]
+            self.enabled[uid] = share.enabled
+            self.priority[uid] = num
+            self.names[uid] = str(share.name)
+
+    def revertEdits(self):
+        self.readState()
+        self.columnChanged(0, 2)
+
+    def setApps(self, apps):
+        self.apps = apps
+        self.columnChanged(5, 5)
+
+    def columnChanged(self, first, last):
+        if self.uids:
+            self.dataChanged.emit(self.index(0, first), self.index(len(self.uids) - 1, last))
+
+    def applyEdits(self):
+        for uid in self.uids:
+            self.sfs.share[uid].enabled = self.enabled[uid]
+            self.sfs.settings["namecache"]["fallback"][uid] = self.names[uid]
+        self.sfs.settings["order"] = sorted(self.uids, key=lambda uid: (self.priority[uid], uid))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.uids)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def flags(self, index):
+        flags = QtCore.Qt.ItemIsEnabled
+        if index.column() == 0:
+            flags |= QtCore.Qt.ItemIsUserCheckable
+        elif index.column() == 1 or (index.column() == 2 and self.sfs.share[self.uids[index.row()]].namefallback):
+            flags |= QtCore.Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        uid = self.uids[index.row()]
+        column = index.column()
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            if column == 0:
+                return "enable"
+            if column == 1:
+                return self.priority[uid]
+            if column == 2:
+                return self.names[uid]
+            if column == 3:
+                return int(uid)
+            if column == 4:
+                return QtCore.QDateTime.fromTime_t(int(self.sfs.share[uid].vdf_sect.get('timeused', 0)))
+            if column == 5:
+                return self.apps.get(uid)
+        elif role == QtCore.Qt.CheckStateRole and column == 0:
+            return QtCore.Qt.Checked if self.enabled[uid] else QtCore.Qt.Unchecked
+        elif role == QtCore.Qt.TextAlignmentRole and column in (3, 5):
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        elif role == QtCore.Qt.ToolTipRole and column == 2 and self.sfs.share[uid].namefallback:
+            return "name not found in Steam's files, click to edit"
+        return None
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        uid = self.uids[index.row()]
+        column = index.column()
+        if role == QtCore.Qt.CheckStateRole and column == 0:
+            self.enabled[uid] = value == QtCore.Qt.Checked
+        elif role == QtCore.Qt.EditRole and column == 1:
+            self.priority[uid] = int(value)
+        elif role == QtCore.Qt.EditRole and column == 2:
+            self.names[uid] = str(value)
+        else:
+            return False
+        self.dataChanged.emit(index, index)
+        return True
+
+
+class PriorityDelegate(QtWidgets.QStyledItemDelegate):
+    def createEditor(self, parent, option, index):
+        editor = QtWidgets.QSpinBox(parent)
+        editor.setRange(1, index.model().rowCount())
+        editor.setFrame(False)
+        return editor
+
+
+class MainProgram(QtWidgets.QMainWindow, gui.Ui_MainWindow):
+    steptext = {"shares": "reading shares", "names": "resolving lender names",
+                "apps": "counting lent apps", "save": "saving"}
+
+    def __init__(self, sfs, edits=None, parent=None):
+        super(MainProgram, self).__init__(parent)
+        self.sfs = sfs
+        self.edits = edits
+        self.saving = False
+        self.workers = []
+        # set on close, stops counting apps for a window that is gone
+        self.cancel = threading.Event()
+        # the save has to finish before the process ends, loading does not
+        self.savepool = QtCore.QThreadPool(self)
+        self.setupUi(self)
+        self.model = ShareModel(sfs, self)
+        self.proxy = QtCore.QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.tableView.setModel(self.proxy)
+        # editors are created when a cell is edited, not per row
+        self.tableView.setItemDelegateForColumn(1, PriorityDelegate(self.tableView))
+        self.tableView.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        self.tableView.setEditTriggers(QtWidgets.QAbstractItemView.AllEditTriggers)
+        self.tableView.verticalHeader().setVisible(False)
+        self.tableView.setSortingEnabled(True)
+        self.tableView.sortByColumn(1, QtCore.Qt.AscendingOrder)
+        self.progress = QtWidgets.QProgressBar()
+        self.progress.setMaximumWidth(160)
+        self.statusBar().addPermanentWidget(self.progress)
+        self.setEditable(False)
+        # the window shows up right away, shares, names and app counts
+        # are filled in as the worker gets them
+        self.start([("shares", self.loadShares), ("names", self.loadNames), ("apps", self.lenderApps)])
+
+    def start(self, steps, pool=None):
+        worker = Worker(steps)
+        worker.signals.step.connect(self.on_worker_step)
+        worker.signals.result.connect(self.on_worker_result)
+        worker.signals.error.connect(self.on_worker_error)
+        worker.signals.finished.connect(lambda: self.on_worker_finished(worker))
+        self.workers.append(worker)
+        self.progress.setRange(0, len(steps))
+        self.progress.setValue(0)
+        self.progress.show()
+        (pool or QtCore.QThreadPool.globalInstance()).start(worker)
+
+    def loadShares(self):
+        self.sfs.load_shares()
+
+    def loadNames(self):
+        self.sfs.gathernames()
+        if self.edits is not None:
+            self.edits()
+        self.sfs.write_settings()
+
+    def lenderApps(self):
+        return self.sfs.lender_apps(self.cancel)
+
+    def saveShares(self):
+        self.sfs.write_settings()
+        self.sfs.write_shares()
+
+    def setEditable(self, editable):
+        self.tableView.setEnabled(editable)
+        for role in (QtWidgets.QDialogButtonBox.Ok, QtWidgets.QDialogButtonBox.Reset):
+            self.buttonBox.button(role).setEnabled(editable)
+
+    @QtCore.pyqtSlot(int, str)
+    def on_worker_step(self, num, name):
+        self.progress.setValue(num)
+        self.statusBar().showMessage(self.steptext[name])
+
+    @QtCore.pyqtSlot(str, object)
+    def on_worker_result(self, name, result):
+        if name == "shares":
+            self.model.loadShares()
+            self.tableView.resizeColumnsToContents()
+        elif name == "names":
+            self.model.revertEdits()
+            self.tableView.resizeColumnToContents(2)
+            self.setEditable(True)
+        elif name == "apps" and result is not None:
+            self.model.setApps(result)
+            self.tableView.resizeColumnToContents(5)
+        elif name == "save":
+            self.saving = False
+            self.close()
+
+    @QtCore.pyqtSlot(str, str)
+    def on_worker_error(self, name, message):
+        if name == "apps":
+            # the app counts are extra information only
+            self.statusBar().showMessage("can't count lent apps: {}".format(message.strip().splitlines()[-1]))
+            return
+        QtWidgets.QMessageBox.critical(self, "SFS select", message)
+        if name == "save":
+            self.saving = False
+            self.setEditable(True)
+        else:
+            self.close()
+
+    def on_worker_finished(self, worker):
+        self.workers.remove(worker)
+        if not self.workers:
+            self.progress.hide()
+            if self.statusBar().currentMessage() in self.steptext.values():
+                self.statusBar().clearMessage()
+
+    @QtCore.pyqtSlot(QtWidgets.QAbstractButton)
+    def on_buttonBox_clicked(self, button):
+        if self.buttonBox.buttonRole(button) == QtWidgets.QDialogButtonBox.AcceptRole:
+            self.model.applyEdits()
+            # the files are written by a worker, the window closes when done
+            self.saving = True
+            self.setEditable(False)
+            self.start([("save", self.saveShares)], self.savepool)
+        if self.buttonBox.buttonRole(button) == QtWidgets.QDialogButtonBox.RejectRole:
+            self.close()
+        if self.buttonBox.buttonRole(button) == QtWidgets.QDialogButtonBox.ResetRole:
+            self.model.revertEdits()
+
+    def closeEvent(self, event):
+        if self.saving:
+            event.ignore()
+        else:
+            self.cancel.set()
+            event.accept()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+namecache.py - persistent lender names with the file each one was found in
+http://steamcommunity.com/groups/familysharing/discussions/0/540736965953254153/
+"""
+
+__copyright__ = "© 2026 by the sfs-select contributors"
+__license__ = "GPL-3.0-or-later"
+
+#    This file is part of sfs-select.
+#
+#    sfs-select is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    sfs-select is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with sfs-select.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import os
+import json
+import time
+
+version = 1
+
+class NameCache(object):
+    # lender names found in localconfig.vdf friend lists; a name is good
+    # as long as the file it came from keeps its mtime, a lender found in
+    # none of the files remembers which file versions were searched
+    def __init__(self, filename, maxsize=4096):
+        self.filename = filename
+        self.maxsize = maxsize
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(filename, encoding="utf-8") as handle:
+                data = json.load(handle)
+            if data["version"] == version:
+                self.entries = data["names"]
+        except (OSError, ValueError, LookupError, TypeError):
+            pass
+
+    def touch(self, entry):
+        # last use for LRU eviction; kept coarse so that steady runs do not
+        # rewrite the file
+        now = int(time.time())
+        if now - entry["used"] > 3600:
+            entry["used"] = now
+            self.dirty = True
+
+    def get(self, uid, stamps):
+        # returns the name and an empty list if it is still good, otherwise
+        # None and the files that need to be searched; stamps maps the
+        # current localconfig.vdf files to their mtimes
+        entry = self.entries.get(uid)
+        if entry is None:
+            return None, list(stamps)
+        self.touch(entry)
+        if entry["name"] is not None:
+            if stamps.get(entry["source"]) == entry["mtime"]:
+                return entry["name"], []
+            return None, list(stamps)
+        return None, [fname for fname, mtime in stamps.items() if entry["searched"].get(fname) != mtime]
+
+    def found(self, uid, name, source, mtime):
+        self.entries[uid] = {"name": name, "source": source, "mtime": mtime, "used": int(time.time())}
+        self.dirty = True
+
+    def searched(self, uid, source, mtime):
+        entry = self.entries.get(uid)
+        if entry is None or entry["name"] is not None:
+            entry = self.entries[uid] = {"name": None, "searched": {}, "used": int(time.time())}
+        entry["searched"][source] = mtime
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        if len(self.entries) > self.maxsize:
+            for uid in sorted(self.entries, key=lambda uid: self.entries[uid]["used"])[:len(self.entries) - self.maxsize]:
+                del self.entries[uid]
+        try:
+            with open(self.filename + ".new", "w", encoding="utf-8") as handle:
+                json.dump({"version": version, "names": self.entries}, handle, sort_keys=True, indent=4, separators=(',', ': '))
+            os.replace(self.filename + ".new", self.filename)
+        except OSError:
+            return
+        self.dirty = False
@@ -30,19 +30,102 @@ import os
 import argparse
 import json
 import sys
-import psutil
+import multiprocessing
+import threading
+import shlex
+import csv
 
 import vdf
-import binvdf
-import gui
+import timings
+import namecache
 
-from PyQt5 import QtCore, QtWidgets
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+harvest_sections = ["UserLocalConfigStore/friends", "UserLocalConfigStore/Licenses"]
+
+def harvestuser(filename, cache=None):
+    res = {"friends": {}, "licenses": []}
+    try:
+        lcfg = vdf.VdfFile(filename, sections=harvest_sections, cache=cache)
+        store = lcfg.data["UserLocalConfigStore"]
+    except (OSError, UnicodeDecodeError, KeyError, ValueError):
+        return res
+    for idnum, data in store.get("friends", {}).items():
+        try:
+            res["friends"][idnum] = str(data["name"])
+        except (LookupError, TypeError):
+            pass
+    for sub in store.get("Licenses", {}):
+        try:
+            res["licenses"].append(int(sub))
+        except ValueError:
+            break
+    return res
+
+# batch operations and the number of arguments they take, None for any
+batch_ops = {"enable": None, "disable": None, "enable-all": 0, "disable-all": 0,
+             "high-priority": None, "low-priority": None, "rename": 2, "locate-source": None}
+
+def readbatch(text):
+    # a JSON list of {"op": ..., "shares"/"apps"/"share"+"name": ...}
+    # objects, or one "op arg..." per line with shell quoting and # comments
+    ops = []
+    if text.lstrip().startswith(("[", "{")):
+        entries = json.loads(text)
+        if isinstance(entries, dict):
+            entries = entries.get("ops", [])
+        for num, entry in enumerate(entries, 1):
+            op = entry.get("op")
+            if op == "rename":
+                words = [entry.get("share"), entry.get("name")]
+            else:
+                key = "shares" if "shares" in entry else "apps"
+                words = entry.get(key, [])
+                # a single share or app may be given without a list
+                if isinstance(words, (str, int)) and not isinstance(words, bool):
+                    words = [words]
+                elif not isinstance(words, list):
+                    raise ValueError("entry {}: \"{}\" must be a list of IDs or names".format(num, key))
+            ops.append((num, op, [str(word) for word in words if word is not None]))
+    else:
+        for num, line in enumerate(text.splitlines(), 1):
+            words = shlex.split(line, comments=True)
+            if not words:
+                continue
+            op, words = words[0], words[1:]
+            if op == "rename" and len(words) > 2:
+                words = [words[0], " ".join(words[1:])]
+            ops.append((num, op, words))
+    return ops
+
+def readappids(handle):
+    # appids separated by whitespace or commas, # starts a comment
+    for num, line in enumerate(handle, 1):
+        for word in line.split("#", 1)[0].replace(",", " ").split():
+            try:
+                yield int(word)
+            except ValueError:
+                print("skipping invalid appid {!r} in line {}".format(word, num), file=sys.stderr)
 
 class sfs_select(object):
     settings_file = "sfs-settings.json"
+    appindex_file = "sfs-appinfo.idx"
+    infocache_file = "sfs-cache.sqlite"
+    namecache_file = "sfs-names.json"
+    vdfcache_dir = "sfs-vdfcache"
+    steam_timeout = 10
+    steam_ready_timeout = 30
 
     def __init__(self):
+        self.harvest = {}
+        self.harvest_parses = 0
+        self.harvest_saved = 0
+        self.pkg_to_uids = None
+        self.infocache = None
+        self.names = None
+        self.steam_quit = None
+        self.config_stamp = None
         self.read_settings() 
 
     def read_settings(self):
@@ -59,9 +142,13 @@ class sfs_select(object):
         self.settings.setdefault("autoquit", False)
         self.settings.setdefault("autostart", False)
         self.settings.setdefault("autorestart", False)
-        self.settings["namecache"].setdefault("time", 0)
-        self.settings["namecache"].setdefault("content", {})
+        self.settings.setdefault("vdfcache", False)
+        self.settings.setdefault("vdfcachesize", 64 << 20)
+        self.settings.setdefault("namecachesize", 4096)
         self.settings["namecache"].setdefault("fallback", {})
+        # names found in Steam's files now live in namecache_file
+        self.settings["namecache"].pop("time", None)
+        self.settings["namecache"].pop("content", None)
 
         if sys.platform == "win32":
             self.settings.setdefault("steampath2", self.settings["steampath"])
@@ -74,6 +161,9 @@ class sfs_select(object):
 
         self.file_config = os.path.join(self.settings["steampath2"], "config", "config.vdf")
         self.file_disabled = "sfs-disabled.vdf"
+        self.vdfcache = None
+        if self.settings["vdfcache"]:
+            self.vdfcache = vdf.VdfCache(self.vdfcache_dir, self.settings["vdfcachesize"])
         if newfile:
             self.write_settings()
 
@@ -88,9 +178,10 @@ class sfs_select(object):
                 handle.write('\t"AuthorizedDevice"\n\t{\n\t}\n')
                 handle.write('}\n')
         self.share = {}
-        self.vdf_config = vdf.VdfFile(self.file_config)
-        self.vdf_disabled = vdf.VdfFile(self.file_disabled)
-        namelist = self.settings["namecache"]["content"]
+        self.config_stamp = self.configstamp()
+        self.vdf_config = vdf.VdfFile(self.file_config, cache=self.vdfcache)
+        self.vdf_disabled = vdf.VdfFile(self.file_disabled, cache=self.vdfcache)
+        namelist = self.settings["namecache"]["fallback"]
         for idnum, share in sorted(list(self.vdf_config.data['InstallConfigStore']['AuthorizedDevice'].items()), key=lambda x: x[1].start):
             self.share[idnum] = sfs_share(share, True, idnum, namelist.get(idnum, "Unknown Lender"))
             if idnum not in self.settings["order"]:
@@ -104,7 +195,47 @@ class sfs_select(object):
             if share not in self.share:
                 self.settings["order"].remove(share)
 
+    def configstamp(self):
+        try:
+            stat = os.stat(self.file_config)
+            return stat.st_ino, stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    def load_shares(self):
+        # with Steam shutting down in the background, config.vdf can be
+        # caught half rewritten; it is read again once Steam is gone
+        try:
+            with timings.phase("read_shares"):
+                self.read_shares()
+            with timings.phase("do_upgrade"):
+                self.do_upgrade()
+        except (ValueError, LookupError, UnicodeDecodeError):
+            if self.steam_quit is None:
+                raise
+            self.wait_steam()
+            with timings.phase("read_shares"):
+                self.read_shares()
+            with timings.phase("do_upgrade"):
+                self.do_upgrade()
+
+    def reapply_shares(self):
+        # config.vdf was rewritten after it was read; the edited state is
+        # carried over to the new file, the order is kept in the settings
+        state = {uid: (share.enabled, share.name, share.namefallback) for uid, share in self.share.items()}
+        self.read_shares()
+        for uid, share in self.share.items():
+            if uid in state:
+                share.enabled, share.name, share.namefallback = state[uid]
+
     def write_shares(self):
+        # edits may have been made while Steam was still shutting down
+        if self.steam_quit is not None:
+            self.wait_steam()
+            if self.configstamp() != self.config_stamp:
+                print("Steam changed {} while shutting down, applying the changes again".format(self.file_config))
+                with timings.phase("reapply_shares"):
+                    self.reapply_shares()
         disabled = self.vdf_disabled.data["InstallConfigStore"]["AuthorizedDevice"]
         enabled = self.vdf_config.data["InstallConfigStore"]["AuthorizedDevice"]
         disabled.clear()
@@ -115,12 +246,9 @@ class sfs_select(object):
                 enabled.append(share.vdf_sect.getraw())
             else:
                 disabled.append(share.vdf_sect.getraw())
-        self.vdf_disabled.compilenewfile(self.file_disabled + ".new")
-        self.vdf_config.compilenewfile(self.file_config + ".new")
-        os.remove(self.file_disabled)
-        os.rename(self.file_disabled + ".new", self.file_disabled)
-        os.remove(self.file_config)
-        os.rename(self.file_config + ".new", self.file_config)
+        self.vdf_disabled.writefile(self.file_disabled)
+        self.vdf_config.writefile(self.file_config)
+        self.config_stamp = self.configstamp()
 
     def print_shares(self):
         print("Shares:")
@@ -131,54 +259,109 @@ class sfs_select(object):
             share.printshare(num)
 
     def gathernames(self):
-        namecache = self.settings["namecache"]["content"]
+        # config.vdf is parsed anyway, localconfig.vdf files only when a
+        # cached name's file has changed or the lender is new
         fallback = self.settings["namecache"]["fallback"]
-        if self.settings["namecache"]["time"] + 360 < time.time():
-            namecache.clear()
-            self.settings["namecache"]["time"] = time.time()
-        namelist = namecache.copy()
-        for idnum in self.share:
-            namelist.setdefault(idnum, "Unknown Lender")
-        for idnum, name in self.vdf_config.data['InstallConfigStore']['AuthorizedLender'].items():
-            try:
-                if namelist[idnum] == "Unknown Lender":
-                    namelist[idnum] = name
-                    namecache[idnum] = name
-            except LookupError:
-                pass
-        if "Unknown Lender" in namelist.values():
-            userfiles = []
-            for root, _, files in os.walk(os.path.join(self.settings["steampath2"], "userdata")):
-                if "localconfig.vdf" in files:
-                    fname = os.path.join(root, "localconfig.vdf")
-                    userfiles.append((os.path.getmtime(fname), fname))
-            userfiles.sort()
-        while "Unknown Lender" in namelist.values() and userfiles:
-            try:
-                lcfg = vdf.VdfFile(userfiles.pop()[1])
-                for idnum, data in lcfg.data["UserLocalConfigStore"]["friends"].items():
-                    try:
-                        if namelist[idnum] == "Unknown Lender":
-                            namelist[idnum] = str(data["name"])
-                            namecache[idnum] = str(data["name"])
-                    except (LookupError, TypeError):
-                        pass
-            except (UnicodeDecodeError, KeyError):
-                pass
+        authorized = self.vdf_config.data['InstallConfigStore']['AuthorizedLender']
+        if self.names is None:
+            self.names = namecache.NameCache(self.namecache_file, self.settings["namecachesize"])
+        stamps = dict(self.userstamps())
+        namelist = {}
+        pending = {}
+        for uid in self.share:
+            if uid in authorized:
+                namelist[uid] = authorized[uid]
+                continue
+            name, files = self.names.get(uid, stamps)
+            if name is not None:
+                namelist[uid] = name
+            elif files:
+                pending[uid] = set(files)
+        if pending:
+            files = [fname for fname in stamps if any(fname in search for search in pending.values())]
+            for fname, harvest in zip(files, self.userharvest(files)):
+                for uid, search in list(pending.items()):
+                    if fname not in search:
+                        continue
+                    name = harvest["friends"].get(uid)
+                    if name is not None:
+                        namelist[uid] = name
+                        self.names.found(uid, name, fname, stamps[fname])
+                        del pending[uid]
+                        continue
+                    self.names.searched(uid, fname, stamps[fname])
+                    search.discard(fname)
+                    if not search:
+                        del pending[uid]
+                if not pending:
+                    break
+        self.names.save()
         self.idlist = {}
-        for uid, _ in self.share.items():
-            name = namelist[uid]
-            if name == "Unknown Lender":
-                self.share[uid].namefallback = True
-                try:
-                    name = fallback[uid]
-                    namelist[uid] = name
-                except LookupError:
-                    pass
+        for uid, share in self.share.items():
+            name = namelist.get(uid)
+            if name is None:
+                share.namefallback = True
+                name = fallback.get(uid, "Unknown Lender")
+                namelist[uid] = name
             self.idlist[name] = uid
-            self.share[uid].name = name
+            share.name = name
         self.settings["namecache"]["fallback"] = namelist
 
+    def userstamps(self):
+        # (localconfig.vdf, mtime) of every user, newest first
+        userfiles = []
+        try:
+            users = os.scandir(os.path.join(self.settings["steampath2"], "userdata"))
+        except OSError:
+            return userfiles
+        with users:
+            for user in users:
+                fname = self.userconfig(user.name)
+                try:
+                    userfiles.append((fname, os.stat(fname).st_mtime_ns))
+                except OSError:
+                    pass
+        userfiles.sort(key=lambda entry: entry[1], reverse=True)
+        return userfiles
+
+    def userfiles(self):
+        return [fname for fname, _ in self.userstamps()]
+
+    def userconfig(self, uid):
+        return os.path.join(self.settings["steampath2"], "userdata", uid, "config", "localconfig.vdf")
+
+    def mpcontext(self):
+        # forking is not safe from a thread (the GUI's workers) or while
+        # other threads run (a background Steam shutdown)
+        if threading.current_thread() is not threading.main_thread() or threading.active_count() > 1:
+            return multiprocessing.get_context("spawn")
+        return None
+
+    def userharvest(self, userfiles):
+        # every localconfig.vdf is parsed at most once per run; files not
+        # harvested yet are parsed concurrently but handed out in the
+        # given order, so callers can let the newest file win
+        pending = [fname for fname in userfiles if fname not in self.harvest]
+        self.harvest_saved += len(userfiles) - len(pending)
+        workers = min(len(pending), os.cpu_count() or 1)
+        pool = ProcessPoolExecutor(workers, mp_context=self.mpcontext()) if workers > 1 else None
+        futures = {}
+        try:
+            if pool:
+                futures = {fname: pool.submit(harvestuser, fname, self.vdfcache) for fname in pending}
+            for fname in userfiles:
+                if fname not in self.harvest:
+                    self.harvest[fname] = futures[fname].result() if pool else harvestuser(fname, self.vdfcache)
+                    self.harvest_parses += 1
+                yield self.harvest[fname]
+        finally:
+            for fname, future in futures.items():
+                if fname not in self.harvest and future.done() and not future.cancelled() and not future.exception():
+                    self.harvest[fname] = future.result()
+                    self.harvest_parses += 1
+            if pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+
     def getid(self, shareid):
         if shareid not in self.share:
             shareid = self.idlist[shareid]
@@ -193,6 +376,97 @@ class sfs_select(object):
                     except LookupError:
                         print("Error: can't find", shareid)
 
+    def apply_edits(self, enable=None, disable=None, enable_others=False, disable_others=False, high_priority=None, low_priority=None):
+        if enable_others or disable_others:
+            for share in self.share.values():
+                share.enabled = enable_others
+        for shareid in self.getallids(enable):
+            self.share[shareid].enabled = True
+        for shareid in self.getallids(disable):
+            self.share[shareid].enabled = False
+        if high_priority or low_priority:
+            done = set()
+            first = []
+            keep = []
+            last = []
+            for uid in self.getallids(high_priority):
+                if uid not in done:
+                    first.append(uid)
+                    done.add(uid)
+            for uid in self.getallids(low_priority):
+                if uid not in done:
+                    last.append(uid)
+                    done.add(uid)
+            for uid in self.settings["order"]:
+                if uid not in done:
+                    keep.append(uid)
+            self.settings["order"] = first + keep + last
+
+    def check_batch(self, ops):
+        # resolve every operation against the current state first, so
+        # a batch is either applied completely or not at all
+        errors = []
+        resolved = []
+        for num, op, words in ops:
+            if op not in batch_ops:
+                errors.append("{}: unknown operation {}".format(num, op))
+                continue
+            count = batch_ops[op]
+            if (count is None and not words) or (count is not None and len(words) != count):
+                errors.append("{}: wrong number of arguments for {}".format(num, op))
+                continue
+            try:
+                if op == "locate-source":
+                    resolved.append((op, [int(word) for word in words]))
+                elif op == "rename":
+                    resolved.append((op, self.getid(words[0]), words[1]))
+                else:
+                    resolved.append((op, [self.getid(word) for word in words]))
+            except ValueError as error:
+                errors.append("{}: {}".format(num, error))
+            except LookupError as error:
+                errors.append("{}: can't find {}".format(num, error.args[0]))
+        return errors, resolved
+
+    def apply_batch(self, resolved):
+        locate = []
+        for op, *params in resolved:
+            if op in ("enable", "disable"):
+                for uid in params[0]:
+                    self.share[uid].enabled = op == "enable"
+            elif op in ("enable-all", "disable-all"):
+                for share in self.share.values():
+                    share.enabled = op == "enable-all"
+            elif op == "high-priority":
+                self.apply_edits(high_priority=params)
+            elif op == "low-priority":
+                self.apply_edits(low_priority=params)
+            elif op == "rename":
+                uid, name = params
+                self.settings["namecache"]["fallback"][uid] = name
+                if self.share[uid].namefallback:
+                    self.share[uid].name = name
+            elif op == "locate-source":
+                locate.extend(params[0])
+        return locate
+
+    def run_batch(self, ops):
+        errors, resolved = self.check_batch(ops)
+        if errors:
+            for error in errors:
+                print("ERROR: batch line {}".format(error))
+            print("batch not applied, nothing was changed")
+            return 1
+        locate = self.apply_batch(resolved)
+        self.write_settings()
+        with timings.phase("write_shares"):
+            self.write_shares()
+        self.print_shares()
+        if locate:
+            with timings.phase("locate_source"):
+                self.locate_source([locate])
+        return 0
+
     def do_upgrade(self):
         if 'AuthorizedLender' in self.vdf_disabled.data['InstallConfigStore']:
             print("upgrading data format to 0.0.3")
@@ -202,35 +476,46 @@ class sfs_select(object):
             self.write_shares()
             self.read_shares()
 
-    def gather_source(self):
-        self.pkg_to_uids = defaultdict(set)
-        self.app_to_pkg = defaultdict(set)
-        for uid in self.share:
-            try:
-                lcfg = vdf.VdfFile(os.path.join(self.settings["steampath2"], "userdata", uid, "config", "localconfig.vdf"))
-                for sub in lcfg.data["UserLocalConfigStore"]["Licenses"]:
-                    self.pkg_to_uids[int(sub)].add(uid)
-            except Exception:
-                pass
-        pkginfo = binvdf.parsepkginfo(os.path.join(self.settings["steampath2"], "appcache", "packageinfo.vdf"))
-        for pkg, data in pkginfo["pkgs"].items():
-            if pkg in self.pkg_to_uids:
-                try:
-                    for app in data[str(pkg)]['appids'].values():
-                        self.app_to_pkg[app].add(pkg)
-                except Exception:
-                    pass
+    def gather_source(self, cancel=None):
+        # cancel (a threading.Event, set e.g. when the GUI closes) is
+        # checked per harvested file and during the package sync; a
+        # cancelled run returns False and leaves pkg_to_uids None
+        pkg_to_uids = defaultdict(set)
+        app_to_pkg = defaultdict(set)
+        uids = list(self.share)
+        with timings.phase("harvest"):
+            for uid, harvest in zip(uids, self.userharvest([self.userconfig(uid) for uid in uids])):
+                if cancel is not None and cancel.is_set():
+                    return False
+                for sub in harvest["licenses"]:
+                    pkg_to_uids[sub].add(uid)
+        if cancel is not None and cancel.is_set():
+            return False
+        if self.infocache is None:
+            import infocache
+            self.infocache = infocache.InfoCache(self.infocache_file)
+        with timings.phase("sync_packages"):
+            if self.infocache.sync_packages(os.path.join(self.settings["steampath2"], "appcache", "packageinfo.vdf"), cancel, 0, self.mpcontext()) is None:
+                return False
+        for pkg, app in self.infocache.package_apps(pkg_to_uids):
+            app_to_pkg[app].add(pkg)
+        self.pkg_to_uids = pkg_to_uids
+        self.app_to_pkg = app_to_pkg
+        return True
 
     def locate_source(self, targetapps):
         targetapps = [int(item) for sublist in targetapps for item in sublist]
-        self.gather_source()
+        if self.pkg_to_uids is None:
+            with timings.phase("gather_source"):
+                self.gather_source()
         priolist = {uid: prio for prio, uid in enumerate(self.settings["order"], 1)}
-        appinfo = binvdf.parseappinfo(os.path.join(self.settings["steampath2"], "appcache", "appinfo.vdf"), limit=targetapps)
+        with timings.phase("app_names"):
+            appnames = self.infocache.app_names(os.path.join(self.settings["steampath2"], "appcache", "appinfo.vdf"), targetapps, self.appindex_file)
         for app in targetapps:
             if len(targetapps) > 1:
                 print()
             try:
-                print("sources for app {} ({}):".format(app, appinfo["apps"][app]["appinfo"]["common"]["name"]))
+                print("sources for app {} ({}):".format(app, appnames[app]))
                 packages = sorted(self.app_to_pkg[app])
                 if packages:
                     for package in packages:
@@ -243,32 +528,101 @@ class sfs_select(object):
             except KeyError:
                 print("unknown app {}".format(app))
 
+    def lender_apps(self, cancel=None):
+        # the number of apps each lender provides, None if cancelled
+        if self.pkg_to_uids is None:
+            with timings.phase("gather_source"):
+                if not self.gather_source(cancel):
+                    return None
+        res = dict.fromkeys(self.share, 0)
+        for packages in self.app_to_pkg.values():
+            for uid in {uid for package in packages for uid in self.pkg_to_uids[package]}:
+                res[uid] += 1
+        return res
+
+    def locate_bulk(self, targetapps=None, form="ndjson", out=None, chunk=1000):
+        # one pass over the app -> package -> lender mapping, streamed in
+        # chunks of appids; targetapps None means every app any lender has
+        out = out or sys.stdout
+        if self.pkg_to_uids is None:
+            with timings.phase("gather_source"):
+                self.gather_source()
+        if targetapps is None:
+            targetapps = sorted(self.app_to_pkg)
+        priolist = {uid: prio for prio, uid in enumerate(self.settings["order"], 1)}
+        appinfo = os.path.join(self.settings["steampath2"], "appcache", "appinfo.vdf")
+        coverage = {uid: {"apps": 0, "unique": 0, "primary": 0} for uid in self.settings["order"]}
+        if form == "csv":
+            writer = csv.writer(out)
+            writer.writerow(["appid", "name", "packages", "lenders", "primary"])
+        targetapps = iter(targetapps)
+        while True:
+            apps = [app for _, app in zip(range(chunk), targetapps)]
+            if not apps:
+                break
+            with timings.phase("app_names"):
+                appnames = self.infocache.app_names(appinfo, apps, self.appindex_file)
+            for app in apps:
+                packages = sorted(self.app_to_pkg.get(app, ()))
+                lenders = sorted({uid for package in packages for uid in self.pkg_to_uids[package]}, key=priolist.get)
+                primary = next((uid for uid in lenders if self.share[uid].enabled), None)
+                for uid in lenders:
+                    coverage[uid]["apps"] += 1
+                if len(lenders) == 1:
+                    coverage[lenders[0]]["unique"] += 1
+                if primary is not None:
+                    coverage[primary]["primary"] += 1
+                if form == "csv":
+                    writer.writerow([app, appnames.get(app, ""), " ".join(map(str, packages)), " ".join(lenders), primary or ""])
+                else:
+                    record = {"type": "app", "appid": app, "name": appnames.get(app), "packages": packages,
+                              "lenders": lenders, "primary": primary}
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+        summary = []
+        for uid in self.settings["order"]:
+            share = self.share[uid]
+            summary.append(dict(coverage[uid], type="lender", lender=uid, name=share.name,
+                                priority=priolist[uid], enabled=share.enabled))
+        if form == "csv":
+            row = "  {:>3}   {:<16} {:>9} {:>7} {:>7} {:>7}"
+            print(row.format("pri", "lender name", "lender ID", "apps", "unique", "primary"), file=sys.stderr)
+            for entry in summary:
+                print(row.format(entry["priority"], entry["name"], entry["lender"], entry["apps"],
+                                  entry["unique"], entry["primary"]), file=sys.stderr)
+        else:
+            for entry in summary:
+                out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        out.flush()
+
     def quit_steam(self):
-        ret = False
-        for proc in psutil.process_iter():
-            try:
-                if proc.name() == self.steam_name:
-                    q = False
-                    try:
-                        q = psutil.Popen([self.steam_exe, "-shutdown"])
-                        q.wait(10)
-                        proc.wait(10)
-                    except (psutil.TimeoutExpired, PermissionError, FileNotFoundError):
-                        if q:
-                            q.kill()
-                        proc.kill()
-                    ret = True
-            except(PermissionError, psutil.AccessDenied):
-                pass
-        if ret:
-            time.sleep(2)
-        return ret
+        import steamctl
+        pidfiles = steamctl.pidfiles(self.settings["steampath"], self.settings["steampath2"])
+        return steamctl.shutdown(self.steam_exe, self.steam_name, pidfiles, self.file_config, self.steam_timeout)
+
+    def quit_steam_background(self):
+        # Steam shuts down while the shares are read and edited, only
+        # write_shares waits for it
+        pool = ThreadPoolExecutor(1)
+        self.steam_quit = pool.submit(self.quit_steam)
+        pool.shutdown(wait=False)
+
+    def wait_steam(self):
+        # returns whether a Steam client was shut down
+        if self.steam_quit is None:
+            return False
+        if not self.steam_quit.done():
+            with timings.phase("wait_steam"):
+                self.steam_quit.result()
+        return self.steam_quit.result()
 
     def start_steam(self):
+        import steamctl
+        pidfiles = steamctl.pidfiles(self.settings["steampath"], self.settings["steampath2"])
         try:
-            psutil.Popen([self.steam_exe])
-        except Exception:
-            pass
+            return steamctl.start(self.steam_exe, self.steam_name, pidfiles, self.steam_ready_timeout)
+        except OSError:
+            return None
 
 
 class sfs_share(object):
@@ -290,81 +644,6 @@ class sfs_share(object):
         print(self.format.format(enabled, num, self.name, self.uid, tuse))
 
 
-class MainProgram(QtWidgets.QMainWindow, gui.Ui_MainWindow):
-    def __init__(self, parent=None):
-        super(MainProgram, self).__init__(parent)
-        self.sfs = sfs
-        self.setupUi(self)
-        self.tableWidget.setRowCount(len(self.sfs.share))
-        self.tableWidget.setColumnCount(5)
-        self.tableWidget.setHorizontalHeaderLabels(("status", "priority", "lender name", "lender ID", "last use"))
-        self.tableWidget.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
-        self.tableWidget.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
-        self.tableWidget.verticalHeader().setVisible(False)
-        self.tableWidget.sortByColumn(1, QtCore.Qt.AscendingOrder)
-        self.resetTable()
-
-    def resetTable(self):
-        self.tableWidget.clearContents()
-        self.tableWidget.setSortingEnabled(False)
-        self.tableWidget.blockSignals(True)
-
-        for num, uid in enumerate(self.sfs.settings["order"]):
-            share = self.sfs.share[uid]
-            item = QtWidgets.QTableWidgetItem("enable")
-            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
-            if share.enabled:
-                item.setCheckState(QtCore.Qt.Checked)
-            else:
-                item.setCheckState(QtCore.Qt.Unchecked)
-            self.tableWidget.setItem(num, 0, item)
-            item = QtWidgets.QTableWidgetItem()
-            item.setData(QtCore.Qt.EditRole, int(num + 1))
-            self.tableWidget.setItem(num, 1, item)
-            self.tableWidget.openPersistentEditor(item)
-            item = QtWidgets.QTableWidgetItem()
-            item.setData(QtCore.Qt.EditRole, str(share.name))
-            self.tableWidget.setItem(num, 2, item)
-            if share.namefallback:
-                self.tableWidget.openPersistentEditor(item)
-            item = QtWidgets.QTableWidgetItem()
-            item.setData(QtCore.Qt.EditRole, int(uid))
-            item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
-            self.tableWidget.setItem(num, 3, item)
-            item = QtWidgets.QTableWidgetItem()
-            tuse = int(share.vdf_sect.get('timeused', 0))
-            item.setData(QtCore.Qt.DisplayRole, QtCore.QDateTime.fromTime_t(tuse))
-            self.tableWidget.setItem(num, 4, item)
-
-        self.tableWidget.blockSignals(False)
-        self.tableWidget.setSortingEnabled(True)
-        self.tableWidget.resizeColumnsToContents()
-
-    @QtCore.pyqtSlot(QtWidgets.QAbstractButton)
-    def on_buttonBox_clicked(self, button):
-        if self.buttonBox.buttonRole(button) == QtWidgets.QDialogButtonBox.AcceptRole:
-            order = []
-            for row in range(self.tableWidget.rowCount()):
-                enabled = (self.tableWidget.item(row, 0).checkState() == QtCore.Qt.Checked)
-                prio = self.tableWidget.item(row, 1).text()
-                name = self.tableWidget.item(row, 2).text()
-                uid = self.tableWidget.item(row, 3).text()
-                self.sfs.share[uid].enabled = enabled
-                order.append((prio, uid))
-                self.sfs.settings["namecache"]["fallback"][uid] = name
-            self.sfs.settings["order"] = [x[1] for x in sorted(order)]
-            self.sfs.write_settings()
-            self.sfs.write_shares()
-            self.close()
-        if self.buttonBox.buttonRole(button) == QtWidgets.QDialogButtonBox.RejectRole:
-            self.close()
-        if self.buttonBox.buttonRole(button) == QtWidgets.QDialogButtonBox.ResetRole:
-            self.resetTable()
-
-#    @QtCore.Slot(QtWidgets.QTableWidgetItem)
-#    def on_tableWidget_itemChanged(self, item):
-#        pass
-
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('-l', '--list', action='store_true', help='show a textual list of all shares')
@@ -381,30 +660,75 @@ def main():
     special = parser.add_argument_group("special features")
     specialex = special.add_mutually_exclusive_group()
     specialex.add_argument('-f', '--locate-source', nargs='+', action='append', metavar='APPID', help='show the sources of specific games')
+    specialex.add_argument('-F', '--locate-bulk', metavar='SOURCE', help='sources of all appids in file SOURCE (- for stdin), or of all lent apps with "all"')
+    special.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson', help='output format of --locate-bulk (default ndjson)')
+    specialex.add_argument('-b', '--batch', metavar='FILE', help='apply a script of operations from FILE (- for stdin) in one transaction')
     exp = parser.add_argument_group('experimental features')
     exp.add_argument('-Q', '--quit-steam', action='store_true', help='quit steam before starting sfs-select')
     exp.add_argument('-S', '--start-steam', action='store_true', help='start steam after sfs-select is done')
     exp.add_argument('-R', '--restart-steam', action='store_true', help='as above but only if it was running')
     exp.add_argument('-N', '--no-auto-steam', action='store_true', help='ignore autostart/quit settings in configfile')
+    daemon_group = parser.add_argument_group('daemon')
+    daemonex = daemon_group.add_mutually_exclusive_group()
+    daemonex.add_argument('--daemon', action='store_true', help='keep running and serve list/edit/locate requests of other sfs-select calls')
+    daemonex.add_argument('--no-daemon', action='store_true', help='do not hand this call to a running daemon')
+    debug = parser.add_argument_group('debugging')
+    debug.add_argument('--timings', nargs='?', const='summary', choices=['summary', 'json'], help='report time, cpu, read bytes and peak memory per phase on stderr')
+    debug.add_argument('--profile', metavar='FILE', help='write cProfile stats of the whole run to FILE')
     args = parser.parse_args()
+    timings.enable(args.timings, args.profile)
 
     global gui
     mode_edit = args.enable or args.disable or args.enable_others or args.disable_others or args.high_priority or args.low_priority
     gui = args.gui
-    if args.locate_source:
+    if args.locate_source or args.batch or args.locate_bulk:
         if mode_edit or gui:
             print("ERROR: special featues are incomptible with other options")
             sys.exit(1)
+    elif args.daemon:
+        if mode_edit or gui or args.list:
+            print("ERROR: --daemon is incompatible with other options")
+            sys.exit(1)
     elif (not mode_edit) and (not args.list):
         gui = True
+    if args.batch:
+        try:
+            if args.batch == "-":
+                batch = readbatch(sys.stdin.read())
+            else:
+                with open(args.batch, encoding="utf-8") as handle:
+                    batch = readbatch(handle.read())
+        except (OSError, ValueError, AttributeError, TypeError) as error:
+            print("ERROR: can't read batch {}: {}".format(args.batch, error))
+            sys.exit(1)
+        mode_edit = True
     if gui:
         mode_edit = True
+        # Qt is only loaded when the GUI is actually shown
+        from PyQt5 import QtWidgets
         gui = QtWidgets.QApplication(sys.argv)
     global sfs
     sfs = sfs_select()
     quit_steam = args.quit_steam or (not args.no_auto_steam and sfs.settings["autoquit"])
     start_steam = args.start_steam or (not args.no_auto_steam and sfs.settings["autostart"])
     restart_steam = args.restart_steam or (not args.no_auto_steam and sfs.settings["autorestart"])
+    # hand plain list/edit/locate calls to a running daemon; steam control,
+    # the gui and measurements stay local
+    if not (gui or args.daemon or args.no_daemon or args.locate_bulk or args.timings or args.profile or start_steam or (mode_edit and quit_steam)):
+        import daemon
+        if args.batch:
+            message = {"op": "batch", "ops": batch}
+        elif args.locate_source:
+            message = {"op": "locate", "apps": args.locate_source}
+        elif mode_edit:
+            message = {"op": "edit", "enable": args.enable, "disable": args.disable,
+                       "enable_others": args.enable_others, "disable_others": args.disable_others,
+                       "high_priority": args.high_priority, "low_priority": args.low_priority}
+        else:
+            message = {"op": "list"}
+        status = daemon.request(message)
+        if status is not None:
+            sys.exit(status)
     while not os.path.isfile(sfs.steam_exe):
         if gui:
             selected = QtWidgets.QFileDialog.getExistingDirectory(None, "Please select Steam directory")
@@ -430,62 +754,104 @@ def main():
             print("You might need to edit {} to point to the steam directory".format(sfs.settings_file))
             sys.exit(1)
 
+    if args.daemon:
+        import daemon
+        if not daemon.available():
+            print("ERROR: --daemon needs unix domain sockets")
+            sys.exit(1)
+        try:
+            daemon.Daemon(sfs).serve()
+        except RuntimeError as error:
+            print("ERROR: {}".format(error))
+            sys.exit(1)
+        return
+
     if mode_edit and quit_steam:
-        quited_steam = sfs.quit_steam()
-        start_steam = start_steam or (restart_steam and quited_steam)
-
-    sfs.read_shares()
-    sfs.do_upgrade()
-    sfs.gathernames()
-    sfs.write_settings()
-
-    if mode_edit or gui:
-        if args.enable_others or args.disable_others:
-            for share in sfs.share.values():
-                share.enabled = args.enable_others
-        for shareid in sfs.getallids(args.enable):
-            sfs.share[shareid].enabled = True
-        for shareid in sfs.getallids(args.disable):
-            sfs.share[shareid].enabled = False
-        if args.high_priority or args.low_priority:
-            done = set()
-            first = []
-            keep = []
-            last = []
-            for uid in sfs.getallids(args.high_priority):
-                if uid not in done:
-                    first.append(uid)
-                    done.add(uid)
-            for uid in sfs.getallids(args.low_priority):
-                if uid not in done:
-                    last.append(uid)
-                    done.add(uid)
-            for uid in sfs.settings["order"]:
-                if uid not in done:
-                    keep.append(uid)
-            sfs.settings["order"] = first + keep + last
+        sfs.quit_steam_background()
+
+    status = 0
+    try:
+        # the gui reads the shares and names itself, in the background
+        if not gui:
+            sfs.load_shares()
+            with timings.phase("gathernames"):
+                sfs.gathernames()
+        # a batch writes the settings once, together with its changes
+        if not (gui or args.batch):
+            sfs.write_settings()
+
         if gui:
-            show_gui()
-        else:
+            with timings.phase("gui"):
+                show_gui(lambda: sfs.apply_edits(args.enable, args.disable, args.enable_others, args.disable_others,
+                                                 args.high_priority, args.low_priority))
+
+        elif args.batch:
+            status = sfs.run_batch(batch)
+
+        elif mode_edit:
+            sfs.apply_edits(args.enable, args.disable, args.enable_others, args.disable_others, args.high_priority, args.low_priority)
             sfs.write_settings()
-            sfs.write_shares()
-            sfs.read_shares()
+            with timings.phase("write_shares"):
+                sfs.write_shares()
+            with timings.phase("read_shares"):
+                sfs.read_shares()
             sfs.print_shares()
 
-    elif args.list:
-        sfs.print_shares()
+        elif args.list:
+            sfs.print_shares()
 
-    elif args.locate_source:
-        sfs.locate_source(args.locate_source)
+        elif args.locate_source:
+            with timings.phase("locate_source"):
+                sfs.locate_source(args.locate_source)
 
-    if start_steam:
-        sfs.start_steam()
+        elif args.locate_bulk:
+            with timings.phase("locate_bulk"):
+                try:
+                    if args.locate_bulk == "all":
+                        sfs.locate_bulk(None, args.format)
+                    elif args.locate_bulk == "-":
+                        sfs.locate_bulk(readappids(sys.stdin), args.format)
+                    else:
+                        with open(args.locate_bulk, encoding="utf-8") as handle:
+                            sfs.locate_bulk(readappids(handle), args.format)
+                except BrokenPipeError:
+                    # the reader went away (e.g. piped into head)
+                    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                    sys.exit(1)
+                except OSError as error:
+                    print("ERROR: can't read {}: {}".format(args.locate_bulk, error), file=sys.stderr)
+                    sys.exit(1)
+
+        timings.count("harvest_parses", sfs.harvest_parses)
+        timings.count("harvest_saved", sfs.harvest_saved)
+
+    finally:
+        # also after a failed run: a Steam that was shut down comes back;
+        # nothing may have been written, Steam still has to be down first
+        if sfs.steam_quit is not None:
+            start_steam = start_steam or (restart_steam and sfs.wait_steam())
+        if start_steam:
+            with timings.phase("start_steam"):
+                steam = sfs.start_steam()
+            if steam is None:
+                print("Steam did not come up within {} seconds".format(sfs.steam_ready_timeout))
+            else:
+                print("Steam is running (pid {})".format(steam.pid))
+    if status:
+        sys.exit(status)
 
 
-def show_gui():
-    mainw = MainProgram()
+def show_gui(edits=None):
+    from mainwindow import MainProgram
+    from PyQt5.QtCore import QThreadPool
+    mainw = MainProgram(sfs, edits)
     mainw.show()
     gui.exec_()
+    # a save in progress has to finish; loading is cancelled on close and
+    # only has to get out of Python before the interpreter goes away
+    mainw.savepool.waitForDone()
+    QThreadPool.globalInstance().waitForDone()
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     main()
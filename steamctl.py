@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+steamctl.py - finding, stopping and starting the Steam client
+http://steamcommunity.com/groups/familysharing/discussions/0/540736965953254153/
+"""
+
+__copyright__ = "© 2026 by the sfs-select contributors"
+__license__ = "GPL-3.0-or-later"
+
+#    This file is part of sfs-select.
+#
+#    sfs-select is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    sfs-select is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with sfs-select.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import sys
+import time
+import select
+import subprocess
+
+import psutil
+
+def pidfiles(*steampaths):
+    # steam.sh records the client pid in ~/.steam/steam.pid, which is a
+    # sibling of the Steam root on most setups
+    res = [os.path.join(path, "steam.pid") for path in steampaths]
+    res.append(os.path.expanduser(os.path.join("~", ".steam", "steam.pid")))
+    return list(dict.fromkeys(res))
+
+def frompidfile(name, pidfiles):
+    for filename in pidfiles:
+        try:
+            with open(filename) as handle:
+                proc = psutil.Process(int(handle.read().strip()))
+            if proc.name() == name and proc.status() != psutil.STATUS_ZOMBIE:
+                return proc
+        except (OSError, ValueError, psutil.Error):
+            pass
+    return None
+
+def scan(name):
+    # only the few needed attributes are fetched per process, and only
+    # own, not yet exited processes count
+    uids = None
+    if hasattr(os, "getuid"):
+        uids = os.getuid()
+    res = []
+    for proc in psutil.process_iter(["name", "uids", "status"] if uids is not None else ["name", "status"]):
+        if proc.info["name"] != name or proc.info["status"] == psutil.STATUS_ZOMBIE:
+            continue
+        if uids is not None and proc.info["uids"] and proc.info["uids"].real != uids:
+            continue
+        res.append(proc)
+    return res
+
+def find(name, pidfiles):
+    proc = frompidfile(name, pidfiles)
+    if proc is not None:
+        return [proc]
+    return scan(name)
+
+def waitexit(procs, timeout):
+    # returns the processes still alive after timeout; exits are
+    # delivered through pidfds where the kernel has them
+    if not procs:
+        return []
+    if not hasattr(os, "pidfd_open"):
+        return psutil.wait_procs(procs, timeout)[1]
+    fds = {}
+    try:
+        for proc in procs:
+            try:
+                fds[os.pidfd_open(proc.pid)] = proc
+            except ProcessLookupError:
+                continue
+            except OSError:
+                for fd in fds:
+                    os.close(fd)
+                fds = {}
+                return psutil.wait_procs(procs, timeout)[1]
+        deadline = time.monotonic() + timeout
+        for fd, proc in list(fds.items()):
+            if not proc.is_running():
+                os.close(fds.pop(fd))
+        while fds:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            for fd in select.select(list(fds), [], [], left)[0]:
+                os.close(fd)
+                del fds[fd]
+        return list(fds.values())
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+def settle(filename, quiet=0.3, timeout=3.0, interval=0.05):
+    # Steam writes config.vdf while shutting down; wait until it has
+    # not changed for quiet seconds
+    def stamp():
+        try:
+            stat = os.stat(filename)
+            return stat.st_ino, stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+    deadline = time.monotonic() + timeout
+    last = stamp()
+    since = time.monotonic()
+    while time.monotonic() < deadline:
+        if time.monotonic() - since >= quiet:
+            return True
+        time.sleep(interval)
+        current = stamp()
+        if current != last:
+            last = current
+            since = time.monotonic()
+    return False
+
+def shutdown(exe, name, pidfiles, config, timeout=10.0):
+    procs = find(name, pidfiles)
+    if not procs:
+        return False
+    helper = None
+    try:
+        helper = subprocess.Popen([exe, "-shutdown"], stdin=subprocess.DEVNULL,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        pass
+    alive = waitexit(procs, timeout)
+    for proc in alive:
+        try:
+            proc.kill()
+        except psutil.Error:
+            pass
+    waitexit(alive, 3.0)
+    if helper is not None:
+        try:
+            helper.wait(1.0)
+        except subprocess.TimeoutExpired:
+            helper.kill()
+            helper.wait()
+    settle(config)
+    return True
+
+def start(exe, name, pidfiles, timeout=30.0, interval=0.1):
+    # returns the Steam client process once it is up, None if it did not
+    # show up within timeout
+    kwargs = {}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    launcher = subprocess.Popen([exe], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, **kwargs)
+    # the pid file is cheap to check, the full scan only runs once a second
+    deadline = time.monotonic() + timeout
+    nextscan = time.monotonic() + 1.0
+    while time.monotonic() < deadline:
+        proc = frompidfile(name, pidfiles)
+        if proc is None and time.monotonic() >= nextscan:
+            procs = [proc for proc in scan(name) if proc.pid != launcher.pid]
+            proc = procs[0] if procs else None
+            nextscan = time.monotonic() + 1.0
+        if proc is not None:
+            return proc
+        time.sleep(interval)
+    return None
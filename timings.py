@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+timings.py - per phase wall/cpu time, read bytes and peak memory of sfs-select runs
+http://steamcommunity.com/groups/familysharing/discussions/0/540736965953254153/
+"""
+
+__copyright__ = "© 2026 by the sfs-select contributors"
+__license__ = "GPL-3.0-or-later"
+
+#    This file is part of sfs-select.
+#
+#    sfs-select is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    sfs-select is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with sfs-select.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import sys
+import time
+import json
+import atexit
+import contextlib
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# phase() hands out this shared no-op context manager unless timings
+# are enabled, so instrumented code costs one call and one test
+current = None
+nullphase = contextlib.nullcontext()
+
+def readbytes():
+    # rchar counts every read() including page cache hits, mmap access
+    # is not included
+    try:
+        with open("/proc/self/io", "rb") as handle:
+            for line in handle:
+                if line.startswith(b"rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def peakrss():
+    if resource is None:
+        return 0
+    scale = 1 if sys.platform == "darwin" else 1024
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+
+class Timings(object):
+    def __init__(self, mode="summary", out=sys.stderr):
+        self.mode = mode
+        self.out = out
+        self.records = []
+        self.counters = {}
+        self.depth = 0
+
+    def sample(self):
+        cpu = os.times()
+        return time.perf_counter(), cpu.user + cpu.system + cpu.children_user + cpu.children_system, readbytes()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        record = {"phase": name, "depth": self.depth}
+        self.records.append(record)
+        self.depth += 1
+        wall, cpu, read = self.sample()
+        try:
+            yield
+        finally:
+            endwall, endcpu, endread = self.sample()
+            self.depth -= 1
+            record.update(wall=endwall - wall, cpu=endcpu - cpu, read=endread - read, peakrss=peakrss())
+            if self.mode == "json":
+                self.emit(record)
+
+    def count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def emit(self, record):
+        print(json.dumps(record, sort_keys=True), file=self.out, flush=True)
+
+    def report(self):
+        if self.mode == "json":
+            if self.counters:
+                self.emit({"counters": self.counters})
+            return
+        form = "{:<28} {:>9} {:>9} {:>10} {:>10}"
+        print(form.format("phase", "wall s", "cpu s", "read KiB", "peak MiB"), file=self.out)
+        for record in self.records:
+            if "wall" not in record:
+                continue
+            name = "  " * record["depth"] + record["phase"]
+            print(form.format(name, "{:.4f}".format(record["wall"]), "{:.4f}".format(record["cpu"]),
+                              record["read"] >> 10, "{:.1f}".format(record["peakrss"] / (1 << 20))), file=self.out)
+        for name, value in sorted(self.counters.items()):
+            print("{:<28} {:>9}".format(name, value), file=self.out)
+        self.out.flush()
+
+def phase(name):
+    if current is None:
+        return nullphase
+    return current.phase(name)
+
+def count(name, value):
+    if current is not None:
+        current.count(name, value)
+
+def enable(mode=None, profile=None):
+    global current
+    if mode is not None:
+        current = Timings(mode)
+        atexit.register(current.report)
+    if profile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        atexit.register(profiler.dump_stats, profile)
+        atexit.register(profiler.disable)
+        profiler.enable()
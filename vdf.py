@@ -25,22 +25,98 @@ __license__ = "GPL-3.0-or-later"
 #    along with sfs-select.  If not, see <https://www.gnu.org/licenses/>.
 
 
-import shlex
+import os
+import re
+import hashlib
+import marshal
+from array import array
 from collections import defaultdict
+from itertools import accumulate
+from operator import methodcaller
+
+# token.lastindex: 2 string, 3 newline, 4 brace, 6 multiline string,
+# 8 unquoted word, 9 stray character, None comment
+lexer = re.compile(r"""
+    "([^"\\\n]*(?:\\[^\n][^"\\\n]*)*)"(\n?)
+  | (\n)
+  | ([{}])
+  | (?:\#|//)[^\n]*
+  | "((?:[^"\\]|\\.)*)"(\n?)
+  | ([^ \t\n{}"]+)(\n?)
+  | ([^ \t\n])
+""", re.X | re.S)
+escape = re.compile(r'\\([\\"])')
+linebreaks = re.compile('[\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+# each item is matched atomically through a lookahead and backreference,
+# so input without a closing brace fails in linear time instead of
+# backtracking through every way to split runs of plain characters
+skipper = re.compile(r'''(?:(?=([^{}"#/]+|"[^"\\]*(?:\\.[^"\\]*)*"|/(?!/)|(?:#|//)[^\n]*))\1)*([{}])''', re.S)
+
+def sectiontree(sections):
+    tree = {}
+    for path in sections:
+        if isinstance(path, str):
+            path = path.split("/")
+        node = tree
+        for key in path[:-1]:
+            if node.get(key) is True:
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[path[-1]] = True
+    return tree
+
+def countleaves(tree):
+    return sum(1 if sub is True else countleaves(sub) for sub in tree.values())
+
+class Skimmer(object):
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        token = lexer.search(self.text, self.pos)
+        if token is None:
+            raise StopIteration
+        self.pos = token.end()
+        return token
+
+    def skip(self):
+        pos = self.pos
+        depth = 1
+        while depth:
+            brace = skipper.match(self.text, pos)
+            if brace is None:
+                raise ValueError("vdf syntax error: unterminated section")
+            pos = brace.end()
+            depth += 1 if brace.group(2) == '{' else -1
+        newlines = self.text.count('\n', self.pos, pos)
+        self.pos = pos
+        return newlines
 
 class VdfStr(str):
+    __slots__ = ("start", "sourcefile")
+
     def __new__(cls, value, sourcefile, line):
         obj = str.__new__(cls, value)
         obj.start = line
-        obj.end = line + 1
         obj.sourcefile = sourcefile
         return obj
 
+    @property
+    def end(self):
+        return self.start + 1
+
     def getraw(self):
         return self.sourcefile.raw[self.start:self.end]
 
 
 class VdfSect(defaultdict):
+    __slots__ = ("start", "end", "sourcefile")
+
     def __init__(self, sourcefile, start):
         super(VdfSect, self).__init__(defaultdict, [])
         self.start = start
@@ -56,71 +132,302 @@ class VdfSect(defaultdict):
     def append(self, lines):
         self.sourcefile.inslines(self.end - 1, lines)
 
+class VdfCache(object):
+    version = 1
+
+    def __init__(self, directory, maxsize):
+        self.directory = directory
+        self.maxsize = maxsize
+
+    def entry(self, sourcefile, sections):
+        key = repr((os.path.abspath(sourcefile), sections)).encode("utf-8")
+        return os.path.join(self.directory, hashlib.sha1(key).hexdigest() + ".vdfc")
+
+    def stamp(self, stat, data):
+        return (self.version, stat.st_size, stat.st_mtime_ns, hashlib.blake2b(data, digest_size=16).digest())
+
+    def get(self, sourcefile, sections, stamp):
+        entry = self.entry(sourcefile, sections)
+        try:
+            with open(entry, "rb") as handle:
+                cached, names, values, packed = marshal.load(handle)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if cached != stamp:
+            return None
+        lines = array("i")
+        lines.frombytes(packed)
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return names, values, lines
+
+    def put(self, sourcefile, sections, stamp, tree):
+        entry = self.entry(sourcefile, sections)
+        names, values, lines = tree
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(entry + ".new", "wb") as handle:
+                marshal.dump((stamp, names, values, lines.tobytes()), handle)
+            os.replace(entry + ".new", entry)
+        except (OSError, ValueError):
+            return
+        self.evict()
+
+    def evict(self):
+        entries = []
+        with os.scandir(self.directory) as cached:
+            for entry in cached:
+                if entry.name.endswith(".vdfc"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxsize:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
 class VdfFile(object):
-    def __init__(self, sourcefile):
+    def __init__(self, sourcefile, sections=None, cache=None):
         self.sourcefile = sourcefile
+        self.sections = sections
+        self.cache = cache
         self.raw = []
-        self.inslist = []
-        self.dellist = []
+        self.rawbytes = None
+        self.singlebyte = True
+        self.offsets = None
+        self.newline = '\n'
+        self.inserts = {}
+        self.deletes = []
         self.data = {}
         self.encoding = "utf-8"
+        self.parse()
+
+    def parse(self):
+        with open(self.sourcefile, "rb") as handle:
+            data = handle.read()
+            stat = os.fstat(handle.fileno())
         try:
-            self.parse()
+            text = data.decode(self.encoding)
         except UnicodeDecodeError:
             self.encoding = "cp1252"
-            self.parse()
-
-    def parse(self):
-        self.raw = []
-        self.inslist = []
-        self.dellist = []
+            text = data.decode(self.encoding)
+        # unchanged parts are later copied from rawbytes, unless newline
+        # normalisation changed the byte length of the lines
+        self.rawbytes = data
+        self.singlebyte = len(data) == len(text)
+        self.offsets = None
+        self.newline = '\n'
+        if '\r' in text:
+            self.rawbytes = None
+            if '\r\n' in text:
+                self.newline = '\r\n'
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        if linebreaks.search(text) is None:
+            self.raw = text.splitlines(True)
+        else:
+            lines = text.split('\n')
+            last = lines.pop()
+            self.raw = [line + '\n' for line in lines]
+            if last:
+                self.raw.append(last)
+        self.inserts = {}
+        self.deletes = []
+        if self.cache is not None:
+            stamp = self.cache.stamp(stat, data)
+            tree = self.cache.get(self.sourcefile, self.sections, stamp)
+            if tree is not None:
+                self.data = self.unpack(*tree)
+                return
         stack = []
         config = VdfSect(self.raw, 0)
         current = config
-        with open(self.sourcefile, encoding=self.encoding) as handle:
-            for line in handle:
-                self.raw.append(line)
-                self.inslist.append([])
-                self.dellist.append(False)
-            handle.seek(0)
-            lexer = shlex.shlex(handle, posix=True)
-            while True:
-                name = lexer.get_token()
-                num = lexer.lineno-1
-                if name == None:
-                    break
-                if name == '}':
-                    current, name = stack.pop()
-                    current[name].end = num+1
-                    #print(num, "end", name)
-                else:
-                    value = lexer.get_token()
-                    if value == '{':
-                        #print(num-1, "start", name)
-                        new = VdfSect(self, num-1)
-                        current[name] = new
-                        stack.append((current, name))
-                        current = new
-                    else:
-                        #print("\t", num, name, value)
-                        current[name] = VdfStr(value, self, num)
+        # only the requested sections are built, everything else is
+        # skimmed by counting braces; want is None inside a wanted section
+        want = None
+        if self.sections is None:
+            tokens = lexer.finditer(text)
+        else:
+            want = sectiontree(self.sections)
+            remaining = countleaves(want)
+            tokens = Skimmer(text)
+        # line numbers follow the old shlex lexer: a string token counts
+        # the whitespace character directly behind it, braces do not
+        line = 0
+        name = None
+        num = 0
+        for token in tokens:
+            kind = token.lastindex
+            if kind == 2:
+                value = token.group(1)
+                if '\\' in value:
+                    value = escape.sub(r'\1', value)
+                if token.group(2):
+                    line += 1
+            elif kind == 3:
+                line += 1
+                continue
+            elif kind == 4:
+                brace = token.group(4)
+                if name is None and brace == '}':
+                    current, name, want = stack.pop()
+                    current[name].end = line+1
+                    if want is not None and want.get(name) is True:
+                        remaining -= 1
+                        if not remaining:
+                            break
+                    name = None
+                    continue
+                if name is not None and brace == '{':
+                    sub = None
+                    if want is not None:
+                        sub = want.get(name)
+                        if sub is None:
+                            line += tokens.skip()
+                            name = None
+                            continue
+                    new = VdfSect(self, num-1)
+                    current[name] = new
+                    stack.append((current, name, want))
+                    current = new
+                    want = None if sub is True else sub
+                    name = None
+                    continue
+                value = brace
+            elif kind == 6:
+                value = escape.sub(r'\1', token.group(5))
+                line += value.count('\n') + bool(token.group(6))
+            elif kind == 8:
+                value = token.group(7)
+                if token.group(8):
+                    line += 1
+            elif kind == 9:
+                raise ValueError("vdf syntax error in line {}".format(line + 1))
+            else:
+                continue
+            if name is None:
+                name = value
+                num = line
+            elif want is None:
+                current[name] = VdfStr(value, self, num)
+                name = None
+            else:
+                if want.get(name) is True:
+                    current[name] = VdfStr(value, self, num)
+                    remaining -= 1
+                    if not remaining:
+                        break
+                name = None
+        else:
+            # sections still open at the end of the input: the file was
+            # cut off, e.g. read while Steam rewrites it
+            if stack:
+                raise ValueError("vdf syntax error: unterminated section")
         config.end = len(self.raw) - 1
         self.data = config
+        if self.cache is not None:
+            self.cache.put(self.sourcefile, self.sections, stamp, self.pack(config, [], [], array("i")))
+
+    def pack(self, sect, names, values, lines):
+        # flat preorder walk: a value of None opens a section, a name of
+        # None closes it; lines holds start (and end for sections)
+        for name, child in sect.items():
+            if isinstance(child, VdfSect):
+                names.append(name)
+                values.append(None)
+                lines.append(child.start)
+                lines.append(child.end)
+                self.pack(child, names, values, lines)
+                names.append(None)
+                values.append(None)
+            elif isinstance(child, VdfStr):
+                names.append(name)
+                values.append(str(child))
+                lines.append(child.start)
+        return names, values, lines
+
+    def unpack(self, names, values, lines):
+        lines = iter(lines)
+        config = VdfSect(self.raw, 0)
+        current = config
+        stack = []
+        for name, value in zip(names, values):
+            if value is not None:
+                current[name] = VdfStr(value, self, next(lines))
+            elif name is None:
+                current = stack.pop()
+            else:
+                new = VdfSect(self, next(lines))
+                new.end = next(lines)
+                current[name] = new
+                stack.append(current)
+                current = new
+        config.end = len(self.raw) - 1
+        return config
 
     def inslines(self, line, content):
-        self.inslist[line].extend(content)
+        self.inserts.setdefault(line, []).extend(content)
 
     def dellines(self, start, end):
-        for line in range(start, end):
-            self.dellist[line] = True
+        if start < end:
+            self.deletes.append((start, end))
 
     def getraw(self):
         return self.raw
 
+    def lineoffset(self, line):
+        if self.offsets is None:
+            if self.singlebyte:
+                lengths = map(len, self.raw)
+            else:
+                lengths = map(len, map(methodcaller("encode", self.encoding), self.raw))
+            self.offsets = list(accumulate(lengths, initial=0))
+        return self.offsets[line]
+
+    def segments(self):
+        # the edit journal as a list of ("copy", first, last) line ranges
+        # and ("insert", lines) blocks in file order
+        count = len(self.raw)
+        points = {0, count}
+        points.update(line for line in self.inserts if line < count)
+        for start, end in self.deletes:
+            points.add(min(start, count))
+            points.add(min(end, count))
+        points = sorted(points)
+        res = []
+        for start, end in zip(points, points[1:]):
+            if start in self.inserts:
+                res.append(("insert", self.inserts[start]))
+            if not any(first <= start < last for first, last in self.deletes):
+                if res and res[-1][0] == "copy" and res[-1][2] == start:
+                    res[-1] = ("copy", res[-1][1], end)
+                else:
+                    res.append(("copy", start, end))
+        return res
+
     def compilenewfile(self, newfile):
-        with open(newfile, "w", encoding=self.encoding) as new:
-            for orgline, delete, insert in zip(self.raw, self.dellist, self.inslist):
-                for insline in insert:
-                    new.write(insline)
-                if not delete:
-                    new.write(orgline)
+        with open(newfile, "wb") as new:
+            for segment in self.segments():
+                if segment[0] == "copy" and self.rawbytes is not None:
+                    new.write(memoryview(self.rawbytes)[self.lineoffset(segment[1]):self.lineoffset(segment[2])])
+                    continue
+                if segment[0] == "copy":
+                    content = ''.join(self.raw[segment[1]:segment[2]])
+                else:
+                    content = ''.join(segment[1])
+                if self.newline != '\n':
+                    content = content.replace('\n', self.newline)
+                new.write(content.encode(self.encoding))
+            new.flush()
+            os.fsync(new.fileno())
+
+    def writefile(self, filename=None):
+        if filename is None:
+            filename = self.sourcefile
+        self.compilenewfile(filename + ".new")
+        os.replace(filename + ".new", filename)